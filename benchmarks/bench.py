@@ -0,0 +1,185 @@
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Offline benchmarks for deploy.py command paths. Each scenario builds a
+# synthetic account in benchmarks/fake_aws.py, runs one awscli command in a
+# fresh process and records wall time, API calls and peak RSS.
+#
+#   python -m benchmarks.bench                      # run and compare to baseline
+#   python -m benchmarks.bench --save-baseline      # record a new baseline
+#   python -m benchmarks.bench --latency-ms 20 --scale 0.1 --only s3-list
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+ZONE_ID = "Z000000000000"
+BUCKET = "bench-bucket"
+STACK_FILE = os.path.join(tempfile.gettempdir(), "awscli-bench-stack.json")
+DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "awscli-bench-download")
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+def setup_s3_list(fake, scale):
+    fake.add_buckets(scaled(1000, scale))
+
+def setup_s3_delete(fake, scale):
+    fake.add_objects(BUCKET, scaled(100000, scale))
+
+def setup_s3_download(fake, scale):
+    # Many small objects plus two large ones, one of them uploaded in parts
+    shutil.rmtree(DOWNLOAD_DIR, ignore_errors=True)
+    for i in range(scaled(500, scale)):
+        fake.put_object_data(BUCKET, f"small/object-{i:05d}", bytes([i % 256]) * 16384)
+    fake.put_object_data(BUCKET, "large/single.bin", b"s" * scaled(64 * 1024 * 1024, scale))
+    fake.put_object_data(BUCKET, "large/multipart.bin", b"m" * scaled(64 * 1024 * 1024, scale),
+                         part_size=8 * 1024 * 1024)
+
+def setup_zones(fake, scale):
+    fake.add_zones(scaled(5000, scale))
+
+def setup_records(fake, scale):
+    fake.add_zones(1)
+    fake.add_records(ZONE_ID, scaled(50000, scale))
+
+def setup_instances(fake, scale):
+    fake.add_instances(scaled(5000, scale))
+
+def setup_stack(fake, scale):
+    # Two instances (the CLI's running-instance quota), then buckets, zones
+    # and records, some of which point at the instances' public IPs
+    pubkey = os.path.join(tempfile.gettempdir(), "awscli-bench.pub")
+    with open(pubkey, "w", encoding="utf-8") as f:
+        f.write("ssh-ed25519 AAAA bench\n")
+    zones = [f"stack{i}.example.com" for i in range(scaled(5, scale))]
+    records = [{"zone": zones[i % len(zones)], "name": f"host{i}", "type": "A",
+                "value": f"${{instance.app-{i % 2 + 1}.public_ip}}" if i < 2 else f"10.0.0.{i}"}
+               for i in range(scaled(25, scale))]
+    stack = {
+        "instances": [{"name": "app-{i}", "count": 2, "type": "t3.nano", "ami": "ubuntu",
+                       "pubkey": pubkey}],
+        "buckets": [{"name": f"stack-bucket-{i}"} for i in range(scaled(8, scale))],
+        "zones": [{"name": zone} for zone in zones],
+        "records": records,
+    }
+    with open(STACK_FILE, "w", encoding="utf-8") as f:
+        json.dump(stack, f)
+
+# name: (setup function, awscli arguments)
+SCENARIOS = {
+    "s3-list": (setup_s3_list, ["s3", "list"]),
+    "s3-delete": (setup_s3_delete, ["s3", "delete", "--N", BUCKET]),
+    "s3-du": (setup_s3_delete, ["s3", "du", "--N", BUCKET, "--depth", "2"]),
+    "s3-download": (setup_s3_download, ["s3", "download", "--N", BUCKET, "--dir", DOWNLOAD_DIR]),
+    "route53-list-zones": (setup_zones, ["route53", "list-zones"]),
+    "route53-list-records": (setup_records, ["route53", "list-records", "--ID", ZONE_ID]),
+    "route53-export-records": (setup_records, ["route53", "export-records", "--ID", ZONE_ID]),
+    "route53-delete-zone": (setup_records, ["route53", "delete-zone", "--ID", ZONE_ID]),
+    "ec2-list": (setup_instances, ["ec2", "list"]),
+    "ec2-stop": (setup_instances, ["ec2", "stop", "--tag", "cli-managed=true"]),
+    "stack-apply": (setup_stack, ["apply", "--file", STACK_FILE, "--yes"]),
+}
+
+def run_one(name, latency, scale):
+    # Runs inside the child process; prints one JSON result line
+    os.environ.update(AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench",
+                      AWS_DEFAULT_REGION="us-east-1", AWSCLI_NO_INVENTORY="1")
+    sys.path.insert(0, REPO_DIR)
+    from benchmarks.fake_aws import FakeAWS
+    from common.clients import add_client_hook
+    import deploy
+
+    setup, argv = SCENARIOS[name]
+    fake = FakeAWS(latency)
+    setup(fake, scale)
+    add_client_hook(fake.attach)
+    builtins.input = lambda *args: "y"
+
+    sys.argv = ["awscli"] + argv
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        deploy.main()
+        wall = time.perf_counter() - started
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss_kb /= 1024  # macOS reports bytes
+    print(json.dumps({"wall": wall, "calls": sum(fake.calls.values()),
+                      "by_operation": dict(fake.calls),
+                      "peak_rss_mb": peak_rss_kb / 1024}))
+
+def run_scenario(name, latency, scale):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench", "--run-one", name,
+         "--latency-ms", str(latency * 1000), "--scale", str(scale)],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def load_baseline(path, settings):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if baseline.get("settings") != settings:
+        print(f"Baseline in {path} was recorded with {baseline.get('settings')}; not comparing.")
+        return {}
+    return baseline.get("results", {})
+
+def compare(result, base, tolerance):
+    # Any extra API call is a regression; wall time gets some slack
+    problems = []
+    if result["calls"] > base["calls"]:
+        problems.append(f"calls {base['calls']} -> {result['calls']}")
+    if result["wall"] > base["wall"] * (1 + tolerance):
+        problems.append(f"wall {base['wall']:.2f}s -> {result['wall']:.2f}s")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for awscli commands")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Injected latency per API call")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for synthetic resource counts")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed wall time increase (0.25 = 25%%)")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    if args.run_one:
+        run_one(args.run_one, latency, args.scale)
+        return
+
+    settings = {"latency_ms": args.latency_ms, "scale": args.scale}
+    baseline = {} if args.save_baseline else load_baseline(args.baseline, settings)
+    results, regressions = {}, []
+    print(f"{'scenario':<24} {'wall (s)':>9} {'calls':>7} {'peak RSS (MB)':>14}  vs baseline")
+    for name in args.only or sorted(SCENARIOS):
+        result = run_scenario(name, latency, args.scale)
+        results[name] = result
+        status = ""
+        if name in baseline:
+            problems = compare(result, baseline[name], args.tolerance)
+            status = "REGRESSION: " + ", ".join(problems) if problems else "ok"
+            if problems:
+                regressions.append(name)
+        print(f"{name:<24} {result['wall']:>9.2f} {result['calls']:>7} {result['peak_rss_mb']:>14.1f}  {status}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
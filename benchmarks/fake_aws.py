@@ -0,0 +1,448 @@
+import bisect
+import fnmatch
+import hashlib
+import io
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+# An in-memory stand-in for the EC2, S3 and Route53 APIs used by this CLI.
+# It hooks botocore's event system: parameters are captured before they are
+# serialized and the before-call event answers the request, so no HTTP call,
+# signing or credentials are involved.
+
+OBJECT_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+class FakeAWSError(Exception):
+    def __init__(self, code, message="", status_code=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+def record_sort_key(name, record_type=""):
+    # Route53 orders records by name with the labels reversed
+    return (tuple(reversed(name.rstrip(".").lower().split("."))), record_type)
+
+class FakeAWS:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.buckets = {}          # name -> tags
+        self.objects = {}          # bucket -> list of (key, version id)
+        self.object_index = {}     # bucket -> {(key, version id): position}
+        self.deleted_objects = {}  # bucket -> set of (key, version id)
+        self.object_data = {}      # (bucket, key) -> (content, etag, part size)
+        self.sorted_keys = {}      # bucket -> ((object count, deleted count), sorted live keys)
+        self.zones = []            # list of zone dicts, in listing order
+        self.zone_tags = {}        # zone id -> tags
+        self.records = {}          # zone id -> sorted list of record sets
+        self.record_keys = {}      # zone id -> sort keys parallel to records
+        self.instances = []        # list of instance dicts
+        self.change_count = 0
+
+    # ------------------------------------------------------------------
+    # Synthetic data
+    # ------------------------------------------------------------------
+    def add_buckets(self, count, managed_every=2):
+        for i in range(count):
+            tags = {"Name": f"bucket-{i:06d}"}
+            if i % managed_every == 0:
+                tags.update({"cli-managed": "true", "access": "private"})
+            self.buckets[f"bucket-{i:06d}"] = tags
+
+    def add_objects(self, bucket_name, count, versions=1):
+        self.buckets.setdefault(bucket_name, {"cli-managed": "true", "access": "private"})
+        objects = [(f"data/{i // 1000:04d}/object-{i:08d}", f"v{v}")
+                   for i in range(count) for v in range(versions)]
+        self.objects[bucket_name] = objects
+        self.object_index[bucket_name] = {obj: i for i, obj in enumerate(objects)}
+        self.deleted_objects[bucket_name] = set()
+        self.sorted_keys.pop(bucket_name, None)
+
+    def put_object_data(self, bucket_name, key, data, part_size=None):
+        # An object with content that GetObject can serve; with part_size its
+        # ETag is the one a multipart upload with that part size would get
+        self.buckets.setdefault(bucket_name, {"cli-managed": "true", "access": "private"})
+        if part_size:
+            parts = [data[i:i + part_size] for i in range(0, len(data), part_size)]
+            combined = b"".join(hashlib.md5(part).digest() for part in parts)
+            etag = f'"{hashlib.md5(combined).hexdigest()}-{len(parts)}"'
+        else:
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.object_data[(bucket_name, key)] = (data, etag, part_size)
+        objects = self.objects.setdefault(bucket_name, [])
+        self.object_index.setdefault(bucket_name, {})[(key, "null")] = len(objects)
+        objects.append((key, "null"))
+        self.deleted_objects.setdefault(bucket_name, set())
+
+    def add_zones(self, count, managed_every=2):
+        for i in range(count):
+            zone_id = f"Z{i:012d}"
+            self.zones.append({"Id": f"/hostedzone/{zone_id}", "Name": f"zone{i}.example.com.",
+                               "CallerReference": str(i), "ResourceRecordSetCount": 2})
+            self.zone_tags[zone_id] = ({"cli-managed": "true"} if i % managed_every == 0 else {})
+            self.set_records(zone_id, self.default_records(f"zone{i}.example.com."))
+
+    def add_records(self, zone_id, count):
+        zone_name = next(z["Name"] for z in self.zones if z["Id"].endswith(zone_id))
+        records = list(self.records[zone_id])
+        for i in range(count):
+            records.append({"Name": f"host{i:06d}.{zone_name}", "Type": "A", "TTL": 300,
+                            "ResourceRecords": [{"Value": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}]})
+        self.set_records(zone_id, records)
+
+    def set_records(self, zone_id, records):
+        records.sort(key=lambda r: record_sort_key(r["Name"], r["Type"]))
+        self.records[zone_id] = records
+        self.record_keys[zone_id] = [record_sort_key(r["Name"], r["Type"]) for r in records]
+
+    def default_records(self, zone_name):
+        return [
+            {"Name": zone_name, "Type": "NS", "TTL": 172800,
+             "ResourceRecords": [{"Value": "ns-1.awsdns-00.com."}]},
+            {"Name": zone_name, "Type": "SOA", "TTL": 900,
+             "ResourceRecords": [{"Value": "ns-1.awsdns-00.com. admin. 1 7200 900 1209600 86400"}]},
+        ]
+
+    def add_instances(self, count, managed_every=1):
+        for i in range(count):
+            tags = [{"Key": "Name", "Value": f"web-{i}"}]
+            if i % managed_every == 0:
+                tags.append({"Key": "cli-managed", "Value": "true"})
+            self.instances.append({
+                "InstanceId": f"i-{i:017x}", "InstanceType": "t3.nano",
+                "State": {"Name": "running" if i % 3 else "stopped"},
+                "PublicIpAddress": f"198.51.{i // 256 % 256}.{i % 256}", "Tags": tags,
+            })
+
+    # ------------------------------------------------------------------
+    # botocore wiring
+    # ------------------------------------------------------------------
+    def attach(self, client):
+        events = client.meta.events
+        events.register("before-parameter-build", self.capture_params)
+        events.register_last("before-call", self.handle_call)
+
+    def capture_params(self, params, context, **kwargs):
+        context["fake_aws_params"] = dict(params)
+
+    def handle_call(self, model, context, **kwargs):
+        params = context.get("fake_aws_params", {})
+        service = model.service_model.endpoint_prefix
+        operation = model.name
+        with self.lock:
+            self.calls[f"{service}.{operation}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        handler = getattr(self, f"{service}_{operation}", None)
+        try:
+            if handler is None:
+                raise FakeAWSError("NotImplemented", f"{service}.{operation} is not faked")
+            parsed = handler(**params) or {}
+            status_code = 200
+        except FakeAWSError as e:
+            parsed = {"Error": {"Code": e.code, "Message": e.message}}
+            status_code = e.status_code
+        parsed.setdefault("ResponseMetadata", {"HTTPStatusCode": status_code, "RetryAttempts": 0})
+        return AWSResponse("https://fake.amazonaws.com/", status_code, {}, None), parsed
+
+    # ------------------------------------------------------------------
+    # S3
+    # ------------------------------------------------------------------
+    def s3_ListBuckets(self, **params):
+        return {"Buckets": [{"Name": name} for name in sorted(self.buckets)]}
+
+    def s3_GetBucketTagging(self, Bucket, **params):
+        tags = self.buckets.get(Bucket)
+        if tags is None:
+            raise FakeAWSError("NoSuchBucket", status_code=404)
+        if "cli-managed" not in tags:
+            raise FakeAWSError("NoSuchTagSet", status_code=404)
+        return {"TagSet": [{"Key": k, "Value": v} for k, v in tags.items()]}
+
+    def s3_PutBucketTagging(self, Bucket, Tagging, **params):
+        self.buckets[Bucket] = {t["Key"]: t["Value"] for t in Tagging["TagSet"]}
+
+    def s3_CreateBucket(self, Bucket, **params):
+        self.buckets.setdefault(Bucket, {})
+
+    def s3_PutPublicAccessBlock(self, Bucket, **params):
+        return {}
+
+    def s3_PutBucketPolicy(self, Bucket, **params):
+        return {}
+
+    def s3_PutObject(self, Bucket, Key, **params):
+        return {"ETag": '"d41d8cd98f00b204e9800998ecf8427e"'}
+
+    def s3_HeadObject(self, Bucket, Key, **params):
+        if (Bucket, Key) not in self.object_data:
+            raise FakeAWSError("404", status_code=404)
+        data, etag, _ = self.object_data[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": etag}
+
+    def s3_GetObject(self, Bucket, Key, Range=None, PartNumber=None, IfMatch=None, **params):
+        if (Bucket, Key) not in self.object_data:
+            raise FakeAWSError("NoSuchKey", status_code=404)
+        data, etag, part_size = self.object_data[(Bucket, Key)]
+        if IfMatch and IfMatch != etag:
+            raise FakeAWSError("PreconditionFailed", status_code=412)
+        start, end = 0, len(data) - 1
+        if PartNumber:
+            size = part_size or len(data)
+            start, end = (PartNumber - 1) * size, min(PartNumber * size, len(data)) - 1
+        elif Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            start, end = int(first), min(int(last), len(data) - 1)
+        body = data[start:end + 1]
+        return {"Body": StreamingBody(io.BytesIO(body), len(body)), "ContentLength": len(body),
+                "ETag": etag, "ContentRange": f"bytes {start}-{end}/{len(data)}"}
+
+    def s3_ListObjectVersions(self, Bucket, KeyMarker=None, VersionIdMarker=None,
+                              MaxKeys=1000, Prefix="", **params):
+        objects = self.objects.get(Bucket, [])
+        start = 0
+        if KeyMarker is not None:
+            start = self.object_index[Bucket][(KeyMarker, VersionIdMarker)] + 1
+        deleted = self.deleted_objects.get(Bucket, set())
+        page = []
+        position = start
+        while position < len(objects) and len(page) < MaxKeys:
+            key, version_id = objects[position]
+            if (key, version_id) not in deleted and key.startswith(Prefix):
+                page.append({"Key": key, "VersionId": version_id, "Size": 1024,
+                             "ETag": '"etag"', "IsLatest": True})
+            position += 1
+        response = {"Versions": page, "IsTruncated": position < len(objects)}
+        if response["IsTruncated"]:
+            last_key, last_version = objects[position - 1]
+            response.update(NextKeyMarker=last_key, NextVersionIdMarker=last_version)
+        return response
+
+    def live_keys(self, bucket_name):
+        # Sorted keys that have not been deleted, cached until objects change
+        objects = self.objects.get(bucket_name, [])
+        deleted = self.deleted_objects.get(bucket_name, set())
+        version = (len(objects), len(deleted))
+        cached = self.sorted_keys.get(bucket_name)
+        if cached is None or cached[0] != version:
+            keys = sorted({key for key, version_id in objects if (key, version_id) not in deleted})
+            cached = self.sorted_keys[bucket_name] = (version, keys)
+        return cached[1]
+
+    def s3_ListObjectsV2(self, Bucket, ContinuationToken=None, MaxKeys=1000,
+                         Prefix="", Delimiter=None, StartAfter=None, **params):
+        keys = self.live_keys(Bucket)
+        if ContinuationToken:
+            start = int(ContinuationToken)
+        else:
+            start = bisect.bisect_left(keys, max(Prefix, StartAfter + "\0") if StartAfter else Prefix)
+        contents, prefixes = [], []
+        position = start
+        while (position < len(keys) and keys[position].startswith(Prefix)
+               and len(contents) + len(prefixes) < MaxKeys):
+            key = keys[position]
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common = key[:len(Prefix) + key[len(Prefix):].index(Delimiter) + 1]
+                prefixes.append({"Prefix": common})
+                # Skip to the first key after everything under common
+                position = bisect.bisect_left(keys, common[:-1] + chr(ord(common[-1]) + 1), position)
+                continue
+            data, etag, _ = self.object_data.get((Bucket, key), (None, '"etag"', None))
+            contents.append({"Key": key, "Size": 1024 if data is None else len(data), "ETag": etag,
+                             "LastModified": OBJECT_TIME})
+            position += 1
+        response = {"Contents": contents, "CommonPrefixes": prefixes,
+                    "KeyCount": len(contents) + len(prefixes),
+                    "IsTruncated": position < len(keys) and keys[position].startswith(Prefix)}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(position)
+        return response
+
+    def s3_DeleteObjects(self, Bucket, Delete, **params):
+        with self.lock:
+            deleted = self.deleted_objects.setdefault(Bucket, set())
+            for obj in Delete["Objects"]:
+                deleted.add((obj["Key"], obj.get("VersionId")))
+        return {}
+
+    def s3_DeleteBucket(self, Bucket, **params):
+        remaining = len(self.objects.get(Bucket, [])) - len(self.deleted_objects.get(Bucket, ()))
+        if remaining:
+            raise FakeAWSError("BucketNotEmpty", status_code=409)
+        self.buckets.pop(Bucket, None)
+
+    # ------------------------------------------------------------------
+    # Route53
+    # ------------------------------------------------------------------
+    def route53_ListHostedZones(self, Marker=None, MaxItems="100", **params):
+        start = int(Marker) if Marker else 0
+        end = start + int(MaxItems)
+        response = {"HostedZones": self.zones[start:end], "Marker": Marker or "",
+                    "MaxItems": MaxItems, "IsTruncated": end < len(self.zones)}
+        if response["IsTruncated"]:
+            response["NextMarker"] = str(end)
+        return response
+
+    def route53_CreateHostedZone(self, Name, CallerReference, **params):
+        with self.lock:
+            zone_id = f"Z{len(self.zones):012d}"
+            zone = {"Id": f"/hostedzone/{zone_id}", "Name": Name.rstrip(".") + ".",
+                    "CallerReference": CallerReference, "ResourceRecordSetCount": 2}
+            self.zones.append(zone)
+            self.zone_tags[zone_id] = {}
+            self.set_records(zone_id, self.default_records(zone["Name"]))
+        return {"HostedZone": zone, "ChangeInfo": {"Id": "/change/create", "Status": "PENDING"},
+                "DelegationSet": {"NameServers": ["ns-1.awsdns-00.com"]},
+                "Location": f"https://route53.amazonaws.com/2013-04-01/hostedzone/{zone_id}"}
+
+    def route53_ChangeTagsForResource(self, ResourceId, AddTags=(), **params):
+        self.zone_tags.setdefault(ResourceId, {}).update({t["Key"]: t["Value"] for t in AddTags})
+        return {}
+
+    def route53_GetHostedZone(self, Id, **params):
+        zone = next((z for z in self.zones if z["Id"].endswith(Id.split("/")[-1])), None)
+        if zone is None:
+            raise FakeAWSError("NoSuchHostedZone", status_code=404)
+        return {"HostedZone": zone, "DelegationSet": {"NameServers": ["ns-1.awsdns-00.com"]}}
+
+    def route53_ListTagsForResource(self, ResourceId, **params):
+        tags = self.zone_tags.get(ResourceId, {})
+        return {"ResourceTagSet": {"ResourceType": "hostedzone", "ResourceId": ResourceId,
+                                   "Tags": [{"Key": k, "Value": v} for k, v in tags.items()]}}
+
+    def route53_ListTagsForResources(self, ResourceIds, **params):
+        if len(ResourceIds) > 10:
+            raise FakeAWSError("InvalidInput", "At most 10 resource IDs per call")
+        return {"ResourceTagSets": [
+            {"ResourceType": "hostedzone", "ResourceId": zone_id,
+             "Tags": [{"Key": k, "Value": v} for k, v in self.zone_tags.get(zone_id, {}).items()]}
+            for zone_id in ResourceIds]}
+
+    def route53_ListResourceRecordSets(self, HostedZoneId, StartRecordName=None,
+                                       StartRecordType=None, MaxItems="300", **params):
+        zone_id = HostedZoneId.split("/")[-1]
+        with self.lock:
+            if zone_id not in self.records:
+                raise FakeAWSError("NoSuchHostedZone", f"No hosted zone found with ID: {zone_id}", 404)
+            records = self.records[zone_id]
+            keys = self.record_keys[zone_id]
+        start = 0
+        if StartRecordName:
+            start = bisect.bisect_left(keys, record_sort_key(StartRecordName, StartRecordType or ""))
+        end = start + int(MaxItems)
+        response = {"ResourceRecordSets": records[start:end], "MaxItems": MaxItems,
+                    "IsTruncated": end < len(records)}
+        if response["IsTruncated"]:
+            response.update(NextRecordName=records[end]["Name"], NextRecordType=records[end]["Type"])
+        return response
+
+    def route53_ChangeResourceRecordSets(self, HostedZoneId, ChangeBatch, **params):
+        zone_id = HostedZoneId.split("/")[-1]
+        changed = {(c["ResourceRecordSet"]["Name"], c["ResourceRecordSet"]["Type"])
+                   for c in ChangeBatch["Changes"]}
+        with self.lock:
+            # Replace the record list rather than mutating it, so pages
+            # already handed out stay consistent
+            records = [r for r in self.records.get(zone_id, [])
+                       if (r["Name"], r["Type"]) not in changed]
+            records += [c["ResourceRecordSet"] for c in ChangeBatch["Changes"]
+                        if c["Action"] != "DELETE"]
+            self.set_records(zone_id, records)
+            self.change_count += 1
+            change_id = f"/change/C{self.change_count:012d}"
+        return {"ChangeInfo": {"Id": change_id, "Status": "PENDING"}}
+
+    def route53_GetChange(self, Id, **params):
+        return {"ChangeInfo": {"Id": Id, "Status": "INSYNC",
+                               "SubmittedAt": datetime.now(timezone.utc)}}
+
+    def route53_DeleteHostedZone(self, Id, **params):
+        zone_id = Id.split("/")[-1]
+        if len(self.records.get(zone_id, [])) > 2:
+            raise FakeAWSError("HostedZoneNotEmpty")
+        self.zones = [z for z in self.zones if not z["Id"].endswith(zone_id)]
+        return {"ChangeInfo": {"Id": "/change/delete", "Status": "PENDING"}}
+
+    # ------------------------------------------------------------------
+    # EC2
+    # ------------------------------------------------------------------
+    def instance_matches(self, instance, filters, instance_ids):
+        if instance_ids and instance["InstanceId"] not in instance_ids:
+            return False
+        tags = {t["Key"]: t["Value"] for t in instance.get("Tags", [])}
+        for instance_filter in filters:
+            name, values = instance_filter["Name"], instance_filter["Values"]
+            if name == "instance-state-name":
+                actual = instance["State"]["Name"]
+            elif name == "instance-id":
+                actual = instance["InstanceId"]
+            elif name.startswith("tag:"):
+                actual = tags.get(name[4:])
+            else:
+                continue
+            # EC2 filter values accept * and ? wildcards
+            if actual is None or not any(fnmatch.fnmatchcase(actual, v) for v in values):
+                return False
+        return True
+
+    def ec2_DescribeInstances(self, Filters=(), InstanceIds=(), NextToken=None,
+                              MaxResults=1000, **params):
+        matches = [i for i in self.instances if self.instance_matches(i, Filters, InstanceIds)]
+        start = int(NextToken) if NextToken else 0
+        end = start + MaxResults
+        response = {"Reservations": [{"Instances": matches[start:end]}]}
+        if end < len(matches):
+            response["NextToken"] = str(end)
+        return response
+
+    def set_state(self, InstanceIds, state):
+        for instance in self.instances:
+            if instance["InstanceId"] in InstanceIds:
+                instance["State"] = {"Name": state}
+        return {}
+
+    def ec2_StartInstances(self, InstanceIds, **params):
+        return self.set_state(InstanceIds, "pending")
+
+    def ec2_StopInstances(self, InstanceIds, **params):
+        return self.set_state(InstanceIds, "stopping")
+
+    def ec2_TerminateInstances(self, InstanceIds, **params):
+        return self.set_state(InstanceIds, "shutting-down")
+
+    def ec2_DescribeKeyPairs(self, KeyNames=(), **params):
+        return {"KeyPairs": [{"KeyName": name} for name in KeyNames]}
+
+    def ec2_RunInstances(self, MinCount, InstanceType, TagSpecifications=(), **params):
+        # New instances come up running straight away
+        tags = [tag for spec in TagSpecifications for tag in spec["Tags"]]
+        launched = []
+        with self.lock:
+            for offset in range(MinCount):
+                i = len(self.instances) + offset
+                launched.append({
+                    "InstanceId": f"i-{i:017x}", "InstanceType": InstanceType,
+                    "State": {"Name": "running"}, "Tags": list(tags),
+                    "PublicIpAddress": f"198.51.{i // 256 % 256}.{i % 256}",
+                })
+            self.instances.extend(launched)
+        return {"Instances": launched, "ReservationId": "r-0"}
+
+    def ec2_CreateTags(self, Resources, Tags, **params):
+        for instance in self.instances:
+            if instance["InstanceId"] in Resources:
+                keys = {tag["Key"] for tag in Tags}
+                instance["Tags"] = [t for t in instance["Tags"] if t["Key"] not in keys] + list(Tags)
+        return {}
+
+    # ------------------------------------------------------------------
+    # SSM
+    # ------------------------------------------------------------------
+    def ssm_GetParameter(self, Name, **params):
+        return {"Parameter": {"Name": Name, "Type": "String", "Value": "ami-0123456789abcdef0"}}
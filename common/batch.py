@@ -0,0 +1,128 @@
+import builtins
+import contextlib
+import io
+import shlex
+import sys
+import threading
+import time
+from common.output import (ContextOutput, ContextThreadPoolExecutor, redirect, restore,
+                           stderr_target, stdout_target)
+
+# Run many awscli command lines in one process, so the boto3 import,
+# credentials and clients are paid for once. Lines run in parallel; a line
+# starting with "&&" runs after the line above it, and only if that line
+# succeeded. Blank lines and "#" comments are ignored.
+
+DEPENDENT_PREFIX = "&&"
+# Commands that cannot run as a batch line
+NOT_BATCHABLE = {"batch": "batch cannot be nested",
+                 "daemon": "daemon cannot run inside a batch"}
+
+def parse_lines(lines, parser):
+    # Returns a list of commands: {"number", "text", "args", "after_previous", "error"}
+    commands = []
+    for number, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        after_previous = text.startswith(DEPENDENT_PREFIX)
+        if after_previous:
+            text = text[len(DEPENDENT_PREFIX):].strip()
+        command = {"number": number, "text": text, "args": None,
+                   "after_previous": after_previous and bool(commands), "error": None}
+        errors = io.StringIO()
+        try:
+            tokens = shlex.split(text, comments=True)
+            if tokens and tokens[0] == "awscli":
+                tokens = tokens[1:]
+            with contextlib.redirect_stderr(errors):
+                command["args"] = parser.parse_args(tokens)
+            # Global flags come before the resource and apply to the whole
+            # process, so they belong on the awscli batch command line
+            if tokens and tokens[0].startswith("-"):
+                command["error"] = f"global flag {tokens[0]} must be given to awscli batch, not per line"
+            elif command["args"].resource in NOT_BATCHABLE:
+                command["error"] = NOT_BATCHABLE[command["args"].resource]
+        except SystemExit:
+            command["error"] = (errors.getvalue().strip().splitlines() or ["invalid command"])[-1]
+        except ValueError as e:
+            command["error"] = str(e)
+        commands.append(command)
+    return commands
+
+def chains(commands):
+    # Group each command with the "&&" lines that follow it
+    grouped = []
+    for command in commands:
+        if command["after_previous"]:
+            grouped[-1].append(command)
+        else:
+            grouped.append([command])
+    return grouped
+
+def run_command(command, parser, dispatch):
+    # The command's stdout and stderr are captured together; it failed if it
+    # returned False or raised
+    buffer = io.StringIO()
+    tokens = redirect(buffer, buffer)
+    started = time.perf_counter()
+    try:
+        result = dispatch(command["args"], parser)
+        command["status"] = "failed" if result is False else "ok"
+    except (Exception, SystemExit) as e:
+        print(f"Error: {e}")
+        command["status"] = "failed"
+    finally:
+        command["seconds"] = time.perf_counter() - started
+        restore(tokens)
+    command["output"] = buffer.getvalue()
+
+def run_batch(lines, parser, dispatch, concurrency=4, assume_yes=False):
+    # Returns True if every command succeeded
+    started = time.perf_counter()
+    commands = parse_lines(lines, parser)
+    stdout, stderr = sys.stdout, sys.stderr
+    print_lock = threading.Lock()
+
+    def answer(prompt=""):
+        # Confirmation prompts cannot be answered interactively here
+        reply = "y" if assume_yes else "n"
+        print(f"{prompt}{reply}")
+        return reply
+
+    def run_chain(chain):
+        for index, command in enumerate(chain):
+            if command["error"]:
+                command.update(status="invalid", seconds=0.0, output=f"Error: {command['error']}\n")
+            else:
+                run_command(command, parser, dispatch)
+            with print_lock:
+                stdout.write(f"[{command['number']}] {command['text']} "
+                             f"({command['status']}, {command['seconds']:.2f}s)\n")
+                for line in command["output"].splitlines():
+                    stdout.write(f"    {line}\n")
+                stdout.flush()
+            if command["status"] != "ok":
+                for skipped in chain[index + 1:]:
+                    skipped.update(status="skipped", seconds=0.0)
+                return
+
+    original_input = builtins.input
+    sys.stdout, builtins.input = ContextOutput(stdout, stdout_target), answer
+    sys.stderr = ContextOutput(stderr, stderr_target)
+    try:
+        with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            list(executor.map(run_chain, chains(commands)))
+    finally:
+        sys.stdout, sys.stderr, builtins.input = stdout, stderr, original_input
+
+    print("Batch report:")
+    print(f"  {'line':>5}  {'status':<8} {'time (s)':>9}  command")
+    for command in commands:
+        print(f"  {command['number']:>5}  {command['status']:<8} {command['seconds']:>9.2f}  {command['text']}")
+    counts = {}
+    for command in commands:
+        counts[command["status"]] = counts.get(command["status"], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{len(commands)} command(s) in {time.perf_counter() - started:.2f}s: {summary or 'nothing to run'}")
+    return all(command["status"] == "ok" for command in commands)
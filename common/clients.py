@@ -0,0 +1,70 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+from common import ratelimit
+
+# Connection settings shared by every client. They can be overridden from the
+# environment or from deploy.py flags through configure().
+settings = {
+    "max_pool_connections": int(os.environ.get("AWSCLI_MAX_POOL_CONNECTIONS", "50")),
+    "tcp_keepalive": os.environ.get("AWSCLI_TCP_KEEPALIVE", "true").lower() == "true",
+    "retry_mode": os.environ.get("AWSCLI_RETRY_MODE", "standard"),
+    "max_attempts": int(os.environ.get("AWSCLI_MAX_ATTEMPTS", "5")),
+}
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_client_hooks = [ratelimit.attach]
+
+def configure(max_pool_connections=None, tcp_keepalive=None, retry_mode=None,
+              max_attempts=None):
+    # Must be called before the first client is built to take effect
+    with _lock:
+        if max_pool_connections is not None:
+            settings["max_pool_connections"] = max_pool_connections
+        if tcp_keepalive is not None:
+            settings["tcp_keepalive"] = tcp_keepalive
+        if retry_mode is not None:
+            settings["retry_mode"] = retry_mode
+        if max_attempts is not None:
+            settings["max_attempts"] = max_attempts
+
+def add_client_hook(hook):
+    # Call hook(client) for every client already built and every future one,
+    # e.g. to register botocore event handlers
+    with _lock:
+        _client_hooks.append(hook)
+        existing = list(_clients.values())
+    for client in existing:
+        hook(client)
+
+def client_config():
+    return Config(
+        max_pool_connections=settings["max_pool_connections"],
+        tcp_keepalive=settings["tcp_keepalive"],
+        retries={"mode": settings["retry_mode"],
+                 "max_attempts": settings["max_attempts"]},
+    )
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session()
+        return _session
+
+def get_client(service, region=None):
+    # One client per (service, region), shared by every module and thread
+    session = get_session()
+    key = (service, region or session.region_name)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = session.client(service, region_name=region,
+                                    config=client_config())
+            for hook in _client_hooks:
+                hook(client)
+            _clients[key] = client
+        return client
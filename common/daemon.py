@@ -0,0 +1,243 @@
+import builtins
+import importlib
+import json
+import os
+import socket
+import sys
+import threading
+from common.cache import cache_dir
+from common.output import (ContextOutput, input_target, redirect, restore, stderr_target,
+                           stdout_target)
+
+# A resident awscli process that keeps boto3, the clients, credentials and
+# the inventory connection warm behind a Unix socket. deploy.main forwards
+# plain resource commands to it when it is running and otherwise runs them
+# in-process.
+#
+# Protocol: one JSON object per line. The client sends
+# {"argv", "cwd", "env"}; the daemon answers with {"out"}, {"err"} and
+# {"prompt"} messages (the client replies to a prompt with {"input"}) and
+# finishes with {"exit": code}, or {"fallback": reason} if the client should
+# run the command itself.
+#
+# Each connection runs on its own thread, so a command waiting on a prompt
+# or a long transfer does not hold up other clients. The daemon never
+# changes directory; path arguments are resolved against the client's cwd.
+# plan and apply run in-process, since manifests may name files relative to
+# the directory they are run from.
+
+FORWARDED_COMMANDS = {"ec2", "s3", "route53"}
+# Arguments holding local file or directory paths
+PATH_ARGS = ["file", "dir", "pubkey_path"]
+# Requests from a shell whose AWS settings differ from the daemon's run
+# in-process instead
+MATCHED_ENV = ["AWS_PROFILE", "AWS_DEFAULT_PROFILE", "AWS_REGION", "AWS_DEFAULT_REGION",
+               "AWS_ACCESS_KEY_ID", "AWS_CONFIG_FILE", "AWS_SHARED_CREDENTIALS_FILE",
+               "AWSCLI_NO_INVENTORY", "AWSCLI_INVENTORY_TTL", "XDG_CACHE_HOME"]
+WARM_MODULES = ["ec2.ec2_instance", "s3.s3_bucket", "route53.route53_zones",
+                "route53.route53_records", "stack.stack_plan"]
+WARM_SERVICES = ["ec2", "s3", "route53", "ssm"]
+
+def socket_path():
+    if os.environ.get("AWSCLI_DAEMON_SOCKET"):
+        return os.environ["AWSCLI_DAEMON_SOCKET"]
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or cache_dir(), "awscli.sock")
+
+def matched_env():
+    return {name: os.environ.get(name) for name in MATCHED_ENV}
+
+def send(stream, message):
+    stream.write((json.dumps(message) + "\n").encode("utf-8"))
+    stream.flush()
+
+def connect(path):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+# --------------------------
+# Client side
+# --------------------------
+def forward(argv):
+    # Run argv in the daemon. Returns its exit code, or None if the command
+    # should run in-process (no daemon, global flags, or a different AWS
+    # environment).
+    if not argv or argv[0] not in FORWARDED_COMMANDS or "-h" in argv or "--help" in argv:
+        return None
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    connection = connect(path)
+    if connection is None:
+        return None
+    with connection, connection.makefile("rwb") as stream:
+        send(stream, {"argv": argv, "cwd": os.getcwd(), "env": matched_env()})
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+            elif "prompt" in message:
+                try:
+                    reply = input(message["prompt"])
+                except EOFError:
+                    reply = ""
+                send(stream, {"input": reply})
+            elif "fallback" in message:
+                return None
+            elif "exit" in message:
+                return message["exit"]
+    # The daemon went away mid-command; do not run it again in case it
+    # already made changes
+    print("Error: lost the connection to the awscli daemon.", file=sys.stderr)
+    return 1
+
+def stop(path=None):
+    connection = connect(path or socket_path())
+    if connection is None:
+        print("No awscli daemon is running.")
+        return
+    with connection, connection.makefile("rwb") as stream:
+        send(stream, {"stop": True})
+        stream.readline()
+    print("awscli daemon stopped.")
+
+# --------------------------
+# Daemon side
+# --------------------------
+class SocketWriter:
+    # File-like object that forwards writes from any thread to the client
+    def __init__(self, stream, key, lock):
+        self.stream = stream
+        self.key = key
+        self.lock = lock
+
+    def write(self, text):
+        if text:
+            with self.lock:
+                send(self.stream, {self.key: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+def warm():
+    from common.clients import get_client, get_session
+    for module in WARM_MODULES:
+        importlib.import_module(module)
+    for service in WARM_SERVICES:
+        get_client(service)
+    get_session().get_credentials()
+
+def resolve_paths(args, cwd):
+    for name in PATH_ARGS:
+        value = getattr(args, name, None)
+        if isinstance(value, str):
+            setattr(args, name, os.path.join(cwd, os.path.expanduser(value)))
+    return args
+
+def handle(connection, parser, dispatch, daemon_env, stopping):
+    # Runs one client's command on this thread; its output, prompts and the
+    # prints of any threads it starts go back to that client
+    with connection, connection.makefile("rwb") as stream:
+        request = json.loads(stream.readline() or "{}")
+        if request.get("stop"):
+            stopping.set()
+            send(stream, {"exit": 0})
+            return
+        if request.get("env") != daemon_env:
+            send(stream, {"fallback": "AWS environment differs from the daemon's"})
+            return
+        lock = threading.Lock()
+
+        def prompt(text=""):
+            with lock:
+                send(stream, {"prompt": text})
+            return json.loads(stream.readline() or "{}").get("input", "")
+
+        code = 0
+        tokens = redirect(SocketWriter(stream, "out", lock), SocketWriter(stream, "err", lock), prompt)
+        try:
+            args = resolve_paths(parser.parse_args(request["argv"]), request["cwd"])
+            if dispatch(args, parser) is False:
+                code = 1
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            restore(tokens)
+        send(stream, {"exit": code})
+
+def serve(parser, dispatch, path=None):
+    path = path or socket_path()
+    if os.path.exists(path):
+        running = connect(path)
+        if running is not None:
+            running.close()
+            print(f"An awscli daemon is already listening on {path}.")
+            return
+        os.unlink(path)  # left behind by a daemon that did not shut down cleanly
+
+    print("Warming up clients...")
+    warm()
+    daemon_env = matched_env()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # socket readable and writable by this user only
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    server.settimeout(1.0)  # wake up now and then to notice a stop request
+    print(f"awscli daemon listening on {path} (Ctrl-C to stop)", flush=True)
+
+    # Output and prompts are routed to the client of the running command
+    original_input = builtins.input
+
+    def context_input(text=""):
+        prompt = input_target.get()
+        return original_input(text) if prompt is None else prompt(text)
+
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = ContextOutput(stdout, stdout_target), ContextOutput(stderr, stderr_target)
+    builtins.input = context_input
+    stopping = threading.Event()
+
+    def run(connection):
+        try:
+            handle(connection, parser, dispatch, daemon_env, stopping)
+        except (OSError, ValueError) as e:
+            print(f"Error handling request: {e}", file=sys.stderr)
+
+    workers = []
+    try:
+        while not stopping.is_set():
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            connection.settimeout(None)
+            worker = threading.Thread(target=run, args=(connection,), daemon=True)
+            worker.start()
+            workers = [w for w in workers if w.is_alive()] + [worker]
+        # Let commands that are still running finish before exiting
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+        sys.stdout, sys.stderr, builtins.input = stdout, stderr, original_input
+    print("awscli daemon stopped.")
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from common.cache import cache_dir
+
+# Seconds an inventory entry stays fresh, per resource kind. Instances change
+# state often; buckets and zones rarely change outside this CLI. Key pairs
+# and resolved AMI IDs back the ec2 create preflight.
+DEFAULT_TTLS = {"ec2": 60, "s3": 3600, "route53": 3600, "keypair": 86400, "ami": 86400}
+TTL_OVERRIDE = os.environ.get("AWSCLI_INVENTORY_TTL")
+
+settings = {"refresh": False, "enabled": os.environ.get("AWSCLI_NO_INVENTORY") is None}
+
+_lock = threading.Lock()
+_connection = None
+
+def set_refresh(refresh):
+    # With refresh set, reads miss so every answer comes from AWS and is then
+    # written back to the store
+    settings["refresh"] = refresh
+
+def ttl_for(kind):
+    if TTL_OVERRIDE is not None:
+        return float(TTL_OVERRIDE)
+    return DEFAULT_TTLS.get(kind, 300)
+
+def connect():
+    global _connection
+    if _connection is None:
+        path = os.path.join(cache_dir(), "inventory.sqlite3")
+        connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " kind TEXT, id TEXT, managed INTEGER, data TEXT, expires REAL,"
+            " PRIMARY KEY (kind, id))")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS listings (kind TEXT PRIMARY KEY, expires REAL)")
+        _connection = connection
+    return _connection
+
+def run(statements):
+    # Execute (sql, params) pairs in one transaction. Cache failures (for
+    # example a read-only home directory) disable the store instead of
+    # failing the command.
+    if not settings["enabled"]:
+        return None
+    with _lock:
+        try:
+            connection = connect()
+            with connection:
+                results = [connection.execute(sql, params).fetchall()
+                           for sql, params in statements]
+            return results
+        except (sqlite3.Error, OSError):
+            settings["enabled"] = False
+            return None
+
+def get(kind, resource_id):
+    # Return (managed, data) for a fresh entry, or None on a miss
+    if settings["refresh"]:
+        return None
+    results = run([("SELECT managed, data FROM entries"
+                    " WHERE kind = ? AND id = ? AND expires > ?",
+                    (kind, resource_id, time.time()))])
+    if not results or not results[0]:
+        return None
+    managed, data = results[0][0]
+    return bool(managed), json.loads(data)
+
+def put(kind, resource_id, managed, data=None):
+    run([("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+          (kind, resource_id, int(managed), json.dumps(data or {}),
+           time.time() + ttl_for(kind)))])
+
+def update(kind, resource_id, **changes):
+    # Merge changes into a cached managed entry, if there is one
+    cached = get(kind, resource_id)
+    if cached and cached[0]:
+        put(kind, resource_id, True, dict(cached[1], **changes))
+
+def delete(kind, resource_id):
+    run([("DELETE FROM entries WHERE kind = ? AND id = ?", (kind, resource_id))])
+
+def get_listing(kind):
+    # Return [(id, data)] for every managed resource of this kind if a full
+    # listing was stored and is still fresh, otherwise None
+    if settings["refresh"]:
+        return None
+    now = time.time()
+    results = run([
+        ("SELECT expires FROM listings WHERE kind = ?", (kind,)),
+        ("SELECT id, data FROM entries WHERE kind = ? AND managed = 1 ORDER BY id",
+         (kind,)),
+    ])
+    if not results or not results[0] or results[0][0][0] <= now:
+        return None
+    return [(resource_id, json.loads(data)) for resource_id, data in results[1]]
+
+def put_listing(kind, managed_items, unmanaged_ids=()):
+    # Replace everything known about this kind with a complete listing
+    expires = time.time() + ttl_for(kind)
+    statements = [("DELETE FROM entries WHERE kind = ?", (kind,))]
+    statements += [("INSERT OR REPLACE INTO entries VALUES (?, ?, 1, ?, ?)",
+                    (kind, resource_id, json.dumps(data), expires))
+                   for resource_id, data in managed_items]
+    statements += [("INSERT OR REPLACE INTO entries VALUES (?, ?, 0, '{}', ?)",
+                    (kind, resource_id, expires))
+                   for resource_id in unmanaged_ids]
+    statements.append(("INSERT OR REPLACE INTO listings VALUES (?, ?)", (kind, expires)))
+    run(statements)
+
+def invalidate_listing(kind):
+    run([("DELETE FROM listings WHERE kind = ?", (kind,))])
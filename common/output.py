@@ -0,0 +1,47 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Per-command output for runners that execute several commands in one
+# process (batch mode and the daemon). A runner swaps sys.stdout/sys.stderr
+# for ContextOutput once, then points the context variables at the running
+# command's own streams. Commands start their worker pools with
+# ContextThreadPoolExecutor, so prints from those threads follow along.
+
+stdout_target = contextvars.ContextVar("stdout_target", default=None)
+stderr_target = contextvars.ContextVar("stderr_target", default=None)
+input_target = contextvars.ContextVar("input_target", default=None)
+
+class ContextOutput:
+    # Stands in for sys.stdout or sys.stderr: writes go to the stream set in
+    # the current context, or to the real stream when none is set
+    def __init__(self, stream, target):
+        self.stream = stream
+        self.target = target
+
+    def current(self):
+        stream = self.target.get()
+        return self.stream if stream is None else stream
+
+    def write(self, text):
+        return self.current().write(text)
+
+    def flush(self):
+        self.current().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    # Runs each task in a copy of the submitting thread's context
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def redirect(stdout, stderr=None, prompt=None):
+    # Send this context's prints (and input() calls) to the given targets.
+    # Returns tokens for restore().
+    return (stdout_target.set(stdout), stderr_target.set(stderr),
+            input_target.set(prompt))
+
+def restore(tokens):
+    for target, token in zip((stdout_target, stderr_target, input_target), tokens):
+        target.reset(token)
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+# Client-side request pacing shared by every client and thread. Each API
+# attempt takes a token from its service bucket and, where one is
+# configured, from its operation bucket. Rates start at the AWS limits below
+# and adapt AIMD-style: a throttling response halves the rate, and calls
+# that succeed raise it again a little at a time up to the limit.
+
+# Requests per second. Route53 allows 5 per account; EC2 refills describe
+# calls at 20/s and instance launches at 2/s; S3 allows 3500 writes/s per
+# prefix.
+SERVICE_RATES = {"route53": 5.0, "ec2": 20.0, "s3": 3500.0}
+OPERATION_RATES = {
+    ("ec2", "RunInstances"): 2.0,
+    ("ec2", "StartInstances"): 5.0,
+    ("ec2", "StopInstances"): 5.0,
+    ("ec2", "TerminateInstances"): 5.0,
+    ("ec2", "CreateTags"): 10.0,
+}
+BURST_SECONDS = 1.0       # bucket capacity, in seconds of traffic at the current rate
+MIN_RATE = 0.5
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0   # throttles from calls already in flight count once
+INCREASE_FRACTION = 0.05  # per second of successful calls, as a share of the limit
+
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestLimitExceeded",
+    "RequestThrottled", "SlowDown", "TooManyRequestsException", "PriorRequestNotComplete",
+}
+
+settings = {"enabled": os.environ.get("AWSCLI_NO_RATE_LIMIT") is None}
+
+_lock = threading.Lock()
+_buckets = {}
+
+def rate_limit(spec):
+    # Parse "service=rate" or "service.Operation=rate" into (key, rate)
+    name, _, rate = spec.partition("=")
+    service, _, operation = name.partition(".")
+    if not service or not rate or float(rate) <= 0:
+        raise ValueError(spec)
+    return (service, operation) if operation else service, float(rate)
+
+def configure(enabled=None, rates=None):
+    # rates maps a service or (service, operation) key to requests per second
+    with _lock:
+        if enabled is not None:
+            settings["enabled"] = enabled
+        for key, rate in (rates or {}).items():
+            if isinstance(key, tuple):
+                OPERATION_RATES[key] = rate
+            else:
+                SERVICE_RATES[key] = rate
+            _buckets.pop(key, None)
+
+if os.environ.get("AWSCLI_RATE_LIMITS"):
+    configure(rates=dict(rate_limit(spec.strip())
+                         for spec in os.environ["AWSCLI_RATE_LIMITS"].split(",")))
+
+def bucket_for(key):
+    # Buckets are created on first use; keys without a limit are unpaced
+    bucket = _buckets.get(key)
+    if bucket is None:
+        limit = OPERATION_RATES.get(key) if isinstance(key, tuple) else SERVICE_RATES.get(key)
+        if limit is None:
+            return None
+        now = time.monotonic()
+        bucket = {"limit": limit, "rate": limit, "tokens": max(1.0, limit * BURST_SECONDS),
+                  "updated": now, "window_start": now, "window_calls": 0, "measured": None,
+                  "decreased": 0.0, "increased": 0.0}
+        _buckets[key] = bucket
+    return bucket
+
+def refill(bucket, now):
+    capacity = max(1.0, bucket["rate"] * BURST_SECONDS)
+    bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+    bucket["updated"] = now
+
+def reserve(bucket, now):
+    # Take one token, going into debt if none is left. Returns how long the
+    # caller must wait for its token; later callers queue behind the debt.
+    refill(bucket, now)
+    bucket["tokens"] -= 1
+    bucket["window_calls"] += 1
+    elapsed = now - bucket["window_start"]
+    if elapsed >= 1.0:
+        bucket["measured"] = bucket["window_calls"] / elapsed
+        bucket["window_start"], bucket["window_calls"] = now, 0
+    return max(0.0, -bucket["tokens"] / bucket["rate"])
+
+def acquire(service, operation):
+    with _lock:
+        now = time.monotonic()
+        wait = 0.0
+        for key in (service, (service, operation)):
+            bucket = bucket_for(key)
+            if bucket is not None:
+                wait = max(wait, reserve(bucket, now))
+    if wait > 0:
+        time.sleep(wait)
+
+def record_throttle(service, operation):
+    # Multiplicative decrease, from the rate actually being sent when that is
+    # below the current limit (e.g. S3 traffic far under 3500/s)
+    with _lock:
+        now = time.monotonic()
+        for key in (service, (service, operation)):
+            bucket = bucket_for(key)
+            if bucket is None or now - bucket["decreased"] < DECREASE_COOLDOWN:
+                continue
+            refill(bucket, now)
+            sending = min(bucket["rate"], bucket["measured"] or bucket["rate"])
+            bucket["rate"] = max(MIN_RATE, sending * DECREASE_FACTOR)
+            bucket["tokens"] = min(bucket["tokens"], 0.0)
+            bucket["decreased"] = now
+
+def record_success(service, operation):
+    # Additive increase, proportional to the time since the last adjustment
+    with _lock:
+        now = time.monotonic()
+        for key in (service, (service, operation)):
+            bucket = bucket_for(key)
+            if bucket is None or bucket["rate"] >= bucket["limit"]:
+                continue
+            refill(bucket, now)
+            step = max(1.0, bucket["limit"] * INCREASE_FRACTION)
+            since = now - max(bucket["decreased"], bucket["increased"])
+            bucket["rate"] = min(bucket["limit"], bucket["rate"] + step * since)
+            bucket["increased"] = now
+
+def attach(client):
+    # before-send fires once per HTTP attempt, so retries are paced too
+    service = client.meta.service_model.service_name
+
+    def on_before_send(event_name, **kwargs):
+        if settings["enabled"]:
+            acquire(service, event_name.rsplit(".", 1)[-1])
+
+    def on_needs_retry(response, operation, **kwargs):
+        if response is None or not settings["enabled"]:
+            return
+        if response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+            record_throttle(service, operation.name)
+        elif response[0].status_code < 500:
+            record_success(service, operation.name)
+
+    client.meta.events.register("before-send", on_before_send)
+    client.meta.events.register("needs-retry", on_needs_retry)
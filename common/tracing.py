@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+import threading
+import time
+from common.clients import add_client_hook
+from common.ratelimit import THROTTLE_CODES
+
+# Per-API-call tracing through botocore's event system. Each call records
+# its operation, wall time, retries, throttled attempts and payload sizes;
+# local phases such as imports and credential resolution are recorded as
+# spans too.
+
+_lock = threading.Lock()
+calls = []
+spans = []
+
+def enable():
+    add_client_hook(attach)
+
+def attach(client):
+    events = client.meta.events
+    events.register("before-call", on_before_call)
+    events.register("request-created", on_request_created)
+    events.register("needs-retry", on_needs_retry)
+    events.register("after-call", on_after_call)
+    events.register("after-call-error", on_after_call_error)
+
+def add_span(name, start, end, category="local"):
+    with _lock:
+        spans.append({"name": name, "category": category, "start": start, "end": end,
+                      "thread": threading.get_ident()})
+
+def on_before_call(model, context, **kwargs):
+    context["trace"] = {
+        "service": model.service_model.endpoint_prefix, "operation": model.name,
+        "start": time.perf_counter(), "attempts": 0, "throttles": 0,
+        "request_bytes": 0, "response_bytes": 0, "thread": threading.get_ident(),
+    }
+
+def on_request_created(request, **kwargs):
+    trace = getattr(request, "context", {}).get("trace")
+    if trace is None:
+        return
+    trace["attempts"] += 1
+    body = request.body
+    if isinstance(body, (bytes, str)):
+        size = len(body)
+    else:
+        size = int(request.headers.get("Content-Length", 0) or 0)
+    trace["request_bytes"] += size
+
+def on_needs_retry(response, request_dict, **kwargs):
+    trace = request_dict.get("context", {}).get("trace")
+    if trace is None or response is None:
+        return
+    code = response[1].get("Error", {}).get("Code")
+    if code in THROTTLE_CODES:
+        trace["throttles"] += 1
+
+def finish(context, status, http_response=None):
+    trace = context.pop("trace", None)
+    if trace is None:
+        return
+    trace["end"] = time.perf_counter()
+    trace["status"] = status
+    if http_response is not None:
+        trace["response_bytes"] = int(http_response.headers.get("content-length", 0) or 0)
+    with _lock:
+        calls.append(trace)
+
+def on_after_call(http_response, context, **kwargs):
+    finish(context, http_response.status_code, http_response)
+
+def on_after_call_error(context, exception, **kwargs):
+    finish(context, type(exception).__name__)
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def print_summary(out=sys.stderr):
+    with _lock:
+        recorded = list(calls)
+        local = list(spans)
+    print("Trace summary:", file=out)
+    for span in local:
+        print(f"  {span['name']:<40} {(span['end'] - span['start']) * 1000:10.1f} ms", file=out)
+    by_operation = {}
+    for call in recorded:
+        by_operation.setdefault(f"{call['service']}.{call['operation']}", []).append(call)
+    print(f"  {'operation':<40} {'calls':>6} {'p50 ms':>9} {'p99 ms':>9} {'total ms':>10}"
+          f" {'retries':>8} {'throttled':>9} {'sent KB':>9} {'recv KB':>9}", file=out)
+    rows = sorted(by_operation.items(),
+                  key=lambda item: -sum(c["end"] - c["start"] for c in item[1]))
+    for operation, operation_calls in rows:
+        latencies = sorted((c["end"] - c["start"]) * 1000 for c in operation_calls)
+        retries = sum(max(c["attempts"] - 1, 0) for c in operation_calls)
+        print(f"  {operation:<40} {len(operation_calls):>6} {percentile(latencies, 0.5):>9.1f}"
+              f" {percentile(latencies, 0.99):>9.1f} {sum(latencies):>10.1f} {retries:>8}"
+              f" {sum(c['throttles'] for c in operation_calls):>9}"
+              f" {sum(c['request_bytes'] for c in operation_calls) / 1024:>9.1f}"
+              f" {sum(c['response_bytes'] for c in operation_calls) / 1024:>9.1f}", file=out)
+    total = sum(c["end"] - c["start"] for c in recorded) * 1000
+    print(f"  {len(recorded)} API calls, {total:.1f} ms total call time", file=out)
+
+def write_chrome_trace(path):
+    # Chrome trace event format; open in chrome://tracing or Perfetto
+    with _lock:
+        origin = min([s["start"] for s in spans] + [c["start"] for c in calls], default=0)
+
+    def event(name, category, start, end, thread, args):
+        return {"name": name, "cat": category, "ph": "X", "pid": os.getpid(),
+                "tid": thread, "ts": (start - origin) * 1e6,
+                "dur": (end - start) * 1e6, "args": args}
+
+    with _lock:
+        events = [event(s["name"], s["category"], s["start"], s["end"], s["thread"], {})
+                  for s in spans]
+        events += [event(f"{c['service']}.{c['operation']}", c["service"], c["start"], c["end"],
+                         c["thread"], {key: c[key] for key in
+                                       ("status", "attempts", "throttles",
+                                        "request_bytes", "response_bytes")})
+                   for c in calls]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -1,13 +1,83 @@
 import argparse
-from ec2 import ec2_instance as ec2_module
-from s3 import s3_bucket as s3_module
-from route53.route53_zones import list_route53_zones, delete_hosted_zone
-from route53 import route53_records as record_module
-from route53 import route53_zones as zone_module
-from route53.route53_records import list_dns_records
+import importlib
+import os
+import sys
+import time
+from common.ratelimit import rate_limit
 
-def main():
+# Resource modules and the AWS service each one talks to. Modules are only
+# imported when their subcommand is selected, so boto3 and its clients are
+# never loaded for commands that do not need them.
+ZONE_MODULE = "route53.route53_zones"
+RECORD_MODULE = "route53.route53_records"
+STACK_MODULE = "stack.stack_plan"
+SERVICE_BY_MODULE = {
+    "ec2.ec2_instance": "ec2",
+    "s3.s3_bucket": "s3",
+    ZONE_MODULE: "route53",
+    RECORD_MODULE: "route53",
+    STACK_MODULE: None,  # talks to every service
+}
+ZONE_ACTIONS = ["create-zone", "list-zones", "delete-zone"]
+
+startup_timings = []
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    startup_timings.append((label, start, time.perf_counter()))
+    return result
+
+def load_module(module_name, profile=False):
+    if not profile:
+        return importlib.import_module(module_name)
+    if "common.clients" in sys.modules:
+        clients = sys.modules["common.clients"]
+    else:
+        clients = timed("import boto3", importlib.import_module, "common.clients")
+    module = timed(f"import {module_name}", importlib.import_module, module_name)
+    service = SERVICE_BY_MODULE[module_name]
+    # The client lands in the shared registry, so the command reuses it
+    if service:
+        timed(f"client {service}", clients.get_client, service)
+    timed("resolve credentials", clients.get_session().get_credentials)
+    return module
+
+def configure_clients(args):
+    # Commands with a --concurrency knob need at least that many pooled
+    # connections, otherwise workers queue behind the connection pool.
+    max_pool_connections = args.max_pool_connections
+    concurrency = getattr(args, "concurrency", None)
+    if max_pool_connections is None and concurrency is not None:
+        max_pool_connections = concurrency
+    if (max_pool_connections is None and args.retry_mode is None
+            and not args.no_keepalive):
+        return
+    from common import clients
+    if args.max_pool_connections is None and max_pool_connections is not None:
+        max_pool_connections = max(max_pool_connections,
+                                   clients.settings["max_pool_connections"])
+    clients.configure(max_pool_connections=max_pool_connections,
+                      tcp_keepalive=False if args.no_keepalive else None,
+                      retry_mode=args.retry_mode)
+
+def print_startup_profile(total):
+    print("Startup profile:", file=sys.stderr)
+    for label, start, end in startup_timings:
+        print(f"  {label:<32} {(end - start) * 1000:8.1f} ms", file=sys.stderr)
+    print(f"  {'total':<32} {total * 1000:8.1f} ms", file=sys.stderr)
+
+def build_parser():
     parser = argparse.ArgumentParser(description="CLI for provisioning AWS resources via Boto3", usage=argparse.SUPPRESS)
+    parser.add_argument("--startup-profile", action="store_true", help="Report import and client construction time to stderr")
+    parser.add_argument("--max-pool-connections", type=int, help="Maximum pooled HTTP connections per AWS client")
+    parser.add_argument("--retry-mode", choices=["legacy", "standard", "adaptive"], help="botocore retry mode")
+    parser.add_argument("--no-keepalive", action="store_true", help="Disable TCP keep-alive on AWS connections")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the local inventory cache and re-read from AWS")
+    parser.add_argument("--rate-limit", action="append", type=rate_limit, metavar="SERVICE[.OPERATION]=RATE", help="Override a client-side rate limit in requests per second, e.g. route53=3 (repeatable)")
+    parser.add_argument("--no-rate-limit", action="store_true", help="Disable client-side rate limiting and throttle backoff")
+    parser.add_argument("--trace", action="store_true", help="Print per-API-call timing, retries and throttles to stderr")
+    parser.add_argument("--trace-file", help="Also write a Chrome trace (JSON) of every API call to this file")
     subparsers = parser.add_subparsers(dest="resource", required=True)
 
     # --------------------------
@@ -17,24 +87,41 @@ def main():
     ec2_subparsers = ec2_parser.add_subparsers(dest="action", required=True)
 
     create_ec2_parser = ec2_subparsers.add_parser("create", help="Create an EC2 instance")
-    create_ec2_parser.add_argument("--name", "--N", required=True, help="Enter name of the EC2 instance")
+    create_ec2_parser.add_argument("--name", "--N", required=True, help="Enter name of the EC2 instance, or a template such as web-{i} with --count")
     create_ec2_parser.add_argument("--instance-type", "--T", required=True, choices=["t3.nano", "t4g.nano"], help="Enter EC2 instance type")
     create_ec2_parser.add_argument("--ami", required=True, choices=["ubuntu", "amazon-linux"], help="AMI type to use")
     create_ec2_parser.add_argument("--pubkey-path", "--K", required=False, help="Enter Path to the SSH public key")
+    create_ec2_parser.add_argument("--count", type=int, default=1, help="Number of instances to launch together")
+    create_ec2_parser.add_argument("--no-wait", action="store_true", help="Return once the launch is accepted instead of waiting for running")
 
-    ec2_subparsers.add_parser("list", help="List EC2 instances managed via CLI")
+    list_ec2_parser = ec2_subparsers.add_parser("list", help="List EC2 instances managed via CLI")
+    list_ec2_parser.add_argument("--state", choices=["pending", "running", "stopping", "stopped", "shutting-down", "terminated"], help="Only list instances in this state")
+    list_ec2_parser.add_argument("--name", "--N", help="Only list instances with this Name tag (wildcards allowed)")
 
     stop_ec2_parser = ec2_subparsers.add_parser("stop", help="Stop an EC2 instance")
-    stop_ec2_parser.add_argument("--instance-id", "--ID", help="Enter EC2 Instance ID to stop")
-    stop_ec2_parser.add_argument("--name", "--N", help="Enter EC2 Instance name to stop")
+    stop_ec2_parser.add_argument("--instance-id", "--ID", nargs="+", help="Enter one or more EC2 Instance IDs to stop")
+    stop_ec2_parser.add_argument("--name", "--N", nargs="+", help="Enter one or more EC2 Instance names to stop")
+    stop_ec2_parser.add_argument("--tag", action="append", help="Only stop instances with this tag (Key=Value, repeatable)")
+    stop_ec2_parser.add_argument("--wait", action="store_true", help="Wait until the instances are stopped")
 
     start_ec2_parser = ec2_subparsers.add_parser("start", help="Start an EC2 instance")
-    start_ec2_parser.add_argument("--instance-id", "--ID", help="Enter EC2 Instance ID to start")
-    start_ec2_parser.add_argument("--name", "--N", help="Enter EC2 Instance name to start")
+    start_ec2_parser.add_argument("--instance-id", "--ID", nargs="+", help="Enter one or more EC2 Instance IDs to start")
+    start_ec2_parser.add_argument("--name", "--N", nargs="+", help="Enter one or more EC2 Instance names to start")
+    start_ec2_parser.add_argument("--tag", action="append", help="Only start instances with this tag (Key=Value, repeatable)")
+    start_ec2_parser.add_argument("--wait", action="store_true", help="Wait until the instances are running")
 
     delete_ec2_parser = ec2_subparsers.add_parser("delete", help="Delete an EC2 instance")
-    delete_ec2_parser.add_argument("--instance-id", "--ID", help="Enter EC2 Instance ID to delete")
-    delete_ec2_parser.add_argument("--name", "--N", help="Enter EC2 Instance name to delete")
+    delete_ec2_parser.add_argument("--instance-id", "--ID", nargs="+", help="Enter one or more EC2 Instance IDs to delete")
+    delete_ec2_parser.add_argument("--name", "--N", nargs="+", help="Enter one or more EC2 Instance names to delete")
+    delete_ec2_parser.add_argument("--tag", action="append", help="Only delete instances with this tag (Key=Value, repeatable)")
+    delete_ec2_parser.add_argument("--wait", action="store_true", help="Wait until the instances are terminated")
+
+    wait_ec2_parser = ec2_subparsers.add_parser("wait", help="Wait for EC2 instances to reach a state")
+    wait_ec2_parser.add_argument("--instance-id", "--ID", nargs="+", help="Enter one or more EC2 Instance IDs to wait for")
+    wait_ec2_parser.add_argument("--name", "--N", nargs="+", help="Enter one or more EC2 Instance names to wait for")
+    wait_ec2_parser.add_argument("--tag", action="append", help="Only wait for instances with this tag (Key=Value, repeatable)")
+    wait_ec2_parser.add_argument("--state", required=True, choices=["running", "stopped", "terminated"], help="State to wait for")
+    wait_ec2_parser.add_argument("--timeout", type=int, default=600, help="Give up after this many seconds")
 
     # --------------------------
     # S3 Commands
@@ -46,14 +133,53 @@ def main():
     create_s3_parser.add_argument("--bucket-name", "--N", required=True, help="Name of the S3 bucket")
     create_s3_parser.add_argument("--access", required=True, choices=["private", "public"], help="Bucket access type")
 
-    s3_subparsers.add_parser("list", help="List S3 buckets managed via CLI")
+    list_s3_parser = s3_subparsers.add_parser("list", help="List S3 buckets managed via CLI")
+    list_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel bucket tag lookups")
 
     upload_s3_parser = s3_subparsers.add_parser("upload", help="Upload a file to an S3 bucket")
     upload_s3_parser.add_argument("--bucket-name", "--N", required=True, help="Target S3 bucket name")
-    upload_s3_parser.add_argument("--file", "--F", required=True, help="File path to upload")
+    upload_source = upload_s3_parser.add_mutually_exclusive_group(required=True)
+    upload_source.add_argument("--file", "--F", help="File path or glob pattern to upload")
+    upload_source.add_argument("--dir", help="Directory to upload recursively")
+    upload_s3_parser.add_argument("--prefix", default="", help="Key prefix for uploaded objects")
+    upload_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel transfer threads")
+    upload_s3_parser.add_argument("--multipart-threshold", type=int, default=8, help="Use multipart uploads above this size in MB")
+    upload_s3_parser.add_argument("--chunk-size", type=int, default=8, help="Multipart chunk size in MB")
+
+    sync_s3_parser = s3_subparsers.add_parser("sync", help="Upload only new or changed files from a directory")
+    sync_s3_parser.add_argument("--bucket-name", "--N", required=True, help="Target S3 bucket name")
+    sync_s3_parser.add_argument("--dir", required=True, help="Directory to sync")
+    sync_s3_parser.add_argument("--prefix", default="", help="Key prefix for uploaded objects")
+    sync_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel hash, check and transfer threads")
+    sync_s3_parser.add_argument("--multipart-threshold", type=int, default=8, help="Use multipart uploads above this size in MB")
+    sync_s3_parser.add_argument("--chunk-size", type=int, default=8, help="Multipart chunk size in MB")
+
+    ls_objects_s3_parser = s3_subparsers.add_parser("ls-objects", help="List the objects in a bucket")
+    ls_objects_s3_parser.add_argument("--bucket-name", "--N", required=True, help="S3 bucket name")
+    ls_objects_s3_parser.add_argument("--prefix", default="", help="Only list keys under this prefix")
+    ls_objects_s3_parser.add_argument("--delimiter", default="/", help="Delimiter used to split the keyspace into partitions")
+    ls_objects_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of partitions listed in parallel")
+
+    du_s3_parser = s3_subparsers.add_parser("du", help="Show object counts and sizes per prefix")
+    du_s3_parser.add_argument("--bucket-name", "--N", required=True, help="S3 bucket name")
+    du_s3_parser.add_argument("--prefix", default="", help="Only count keys under this prefix")
+    du_s3_parser.add_argument("--delimiter", default="/", help="Delimiter between prefix levels")
+    du_s3_parser.add_argument("--depth", type=int, default=1, help="Prefix levels below --prefix to report (0: total only)")
+    du_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of partitions listed in parallel")
+
+    download_s3_parser = s3_subparsers.add_parser("download", help="Download an object, a prefix or a whole bucket")
+    download_s3_parser.add_argument("--bucket-name", "--N", required=True, help="Source S3 bucket name")
+    download_source = download_s3_parser.add_mutually_exclusive_group()
+    download_source.add_argument("--key", "--K", help="Download a single object")
+    download_source.add_argument("--prefix", default="", help="Download every object under this key prefix (default: whole bucket)")
+    download_s3_parser.add_argument("--dir", default=".", help="Local directory to download into")
+    download_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel GET requests")
+    download_s3_parser.add_argument("--multipart-threshold", type=int, default=8, help="Fetch objects above this size in MB as parallel ranges")
+    download_s3_parser.add_argument("--chunk-size", type=int, default=8, help="Range size in MB")
 
     delete_s3_parser = s3_subparsers.add_parser("delete", help="Delete an S3 bucket")
     delete_s3_parser.add_argument("--bucket-name", "--N", required=True, help="Target S3 bucket name")
+    delete_s3_parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel DeleteObjects requests")
 
     # --------------------------
     # Route53 Commands
@@ -69,68 +195,219 @@ def main():
     create_record_parser.add_argument("--record-name", "--N", required=True, help="DNS record name")
     create_record_parser.add_argument("--record-type", "--T", required=True, help="Record type (e.g., A, CNAME)")
     create_record_parser.add_argument("--record-value", "--V", required=True, help="Record value (e.g., IP address)")
+    create_record_parser.add_argument("--wait", action="store_true", help="Wait until the change is INSYNC")
+
+    update_record_parser = route53_subparsers.add_parser("update-record", help="Update an existing DNS record in a hosted zone")
+    update_record_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
+    update_record_parser.add_argument("--record-name", "--N", required=True, help="DNS record name")
+    update_record_parser.add_argument("--record-type", "--T", required=True, help="Record type (e.g., A, CNAME)")
+    update_record_parser.add_argument("--record-value", "--V", required=True, help="New record value (e.g., IP address)")
+    update_record_parser.add_argument("--wait", action="store_true", help="Wait until the change is INSYNC")
 
     delete_record_parser = route53_subparsers.add_parser("delete-record", help="Delete a DNS record in a hosted zone")
     delete_record_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
     delete_record_parser.add_argument("--record-name", "--N", required=True, help="DNS record name")
 
-    route53_subparsers.add_parser("list-zones", help="List Route53 zones managed via CLI")
+    list_zones_parser = route53_subparsers.add_parser("list-zones", help="List Route53 zones managed via CLI")
+    list_zones_parser.add_argument("--concurrency", type=int, default=4, help="Number of parallel tag lookups (each covers 10 zones)")
     list_records_parser = route53_subparsers.add_parser("list-records", help="List DNS records in a hosted zone")
     list_records_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
+    list_records_parser.add_argument("--type", "--T", help="Only list records of this type (e.g., A, CNAME)")
+    list_records_parser.add_argument("--name-prefix", help="Only list this record name and its subdomains")
 
     delete_zone_parser = route53_subparsers.add_parser("delete-zone", help="Delete a hosted zone")
     delete_zone_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
 
+    import_records_parser = route53_subparsers.add_parser("import-records", help="Import DNS records from a BIND, JSON or CSV file")
+    import_records_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
+    import_records_parser.add_argument("--file", "--F", required=True, help="Zone file to import")
+    import_records_parser.add_argument("--format", choices=["bind", "json", "csv"], help="File format (default: from the file extension)")
+    import_records_parser.add_argument("--wait", action="store_true", help="Wait until all changes are INSYNC")
+
+    export_records_parser = route53_subparsers.add_parser("export-records", help="Export DNS records to a BIND, JSON or CSV file")
+    export_records_parser.add_argument("--zone-id", "--ID", required=True, help="Hosted Zone ID")
+    export_records_parser.add_argument("--file", "--F", help="Output file (default: stdout)")
+    export_records_parser.add_argument("--format", choices=["bind", "json", "csv"], help="File format (default: from the file extension, or bind)")
+
+    wait_changes_parser = route53_subparsers.add_parser("wait-changes", help="Wait for Route53 changes to reach INSYNC")
+    wait_changes_parser.add_argument("--change-id", "--ID", nargs="+", required=True, help="One or more change IDs")
+    wait_changes_parser.add_argument("--timeout", type=int, default=900, help="Give up after this many seconds")
+
     # --------------------------
-    # Parse and Dispatch
+    # Stack Commands
     # --------------------------
-    args = parser.parse_args()
+    plan_parser = subparsers.add_parser("plan", help="Show the changes needed to converge a stack manifest")
+    plan_parser.add_argument("--file", "--F", "-f", required=True, help="Stack manifest (YAML or JSON)")
+    plan_parser.add_argument("--concurrency", type=int, default=8, help="Number of parallel state lookups")
 
+    apply_parser = subparsers.add_parser("apply", help="Create or update everything in a stack manifest")
+    apply_parser.add_argument("--file", "--F", "-f", required=True, help="Stack manifest (YAML or JSON)")
+    apply_parser.add_argument("--concurrency", type=int, default=8, help="Number of resources changed in parallel")
+    apply_parser.add_argument("--wait", action="store_true", help="Wait until all DNS changes are INSYNC")
+    apply_parser.add_argument("--yes", "-y", action="store_true", help="Apply without asking for confirmation")
+
+    # --------------------------
+    # Batch Mode
+    # --------------------------
+    batch_parser = subparsers.add_parser("batch", help="Run many awscli commands in one process")
+    batch_parser.add_argument("--file", "--F", "-f", default="-", help="File with one command per line (default: stdin)")
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="Number of commands run in parallel")
+    batch_parser.add_argument("--yes", "-y", action="store_true", help="Answer yes to confirmation prompts (default: no)")
+
+    # --------------------------
+    # Daemon
+    # --------------------------
+    daemon_parser = subparsers.add_parser("daemon", help="Keep clients warm in a background process that other awscli runs forward to")
+    daemon_parser.add_argument("--socket", help="Unix socket path (default: $AWSCLI_DAEMON_SOCKET or awscli.sock in $XDG_RUNTIME_DIR or the cache directory)")
+    daemon_parser.add_argument("--stop", action="store_true", help="Stop the running daemon")
+
+    return parser
+
+def dispatch(args, parser, profile=False):
+    # Returns the command's result; False means it failed
+    result = None
     if args.resource == "ec2":
+        ec2_module = load_module("ec2.ec2_instance", profile)
         if args.action == "create":
-            ec2_module.create_ec2(args.name, args.instance_type, args.ami,args.pubkey_path)
+            result = ec2_module.create_ec2(args.name, args.instance_type, args.ami,args.pubkey_path, args.count,
+                                           wait=not args.no_wait)
         elif args.action == "list":
-            ec2_module.list_ec2()
+            result = ec2_module.list_ec2(args.state, args.name)
         elif args.action == "start":
-            ec2_module.start_ec2(args.name, args.instance_type)
+            result = ec2_module.start_ec2(args.instance_id, args.name, args.tag, args.wait)
         elif args.action == "stop":
-            ec2_module.stop_ec2(args.instance_id,args.name)
+            result = ec2_module.stop_ec2(args.instance_id, args.name, args.tag, args.wait)
         elif args.action == "delete":
-            ec2_module.delete_ec2(args.instance_id, args.name)
+            result = ec2_module.delete_ec2(args.instance_id, args.name, args.tag, args.wait)
+        elif args.action == "wait":
+            result = ec2_module.wait_ec2(args.instance_id, args.name, args.tag, args.state, args.timeout)
 
     elif args.resource == "s3":
+        s3_module = load_module("s3.s3_bucket", profile)
         if args.action == "create":
-            s3_module.create_s3(args.bucket_name, args.access)
+            result = s3_module.create_s3(args.bucket_name, args.access)
         elif args.action == "list":
-            s3_module.list_s3()
+            result = s3_module.list_s3(args.concurrency)
         elif args.action == "upload":
-            s3_module.upload_to_s3(args.bucket_name, args.file)
+            result = s3_module.upload_to_s3(args.bucket_name, args.file, args.dir, args.prefix,
+                                            args.concurrency, args.multipart_threshold,
+                                            args.chunk_size)
+        elif args.action == "sync":
+            result = s3_module.sync_to_s3(args.bucket_name, args.dir, args.prefix,
+                                          args.concurrency, args.multipart_threshold,
+                                          args.chunk_size)
+        elif args.action == "ls-objects":
+            result = s3_module.ls_objects_s3(args.bucket_name, args.prefix, args.delimiter, args.concurrency)
+        elif args.action == "du":
+            result = s3_module.du_s3(args.bucket_name, args.prefix, args.delimiter, args.depth, args.concurrency)
+        elif args.action == "download":
+            result = s3_module.download_s3(args.bucket_name, args.key, args.prefix, args.dir,
+                                           args.concurrency, args.multipart_threshold,
+                                           args.chunk_size)
         elif args.action == "delete":
-            s3_module.delete_s3(args.bucket_name)
+            result = s3_module.delete_s3(args.bucket_name, args.concurrency)
 
     elif args.resource == "route53":
+        if args.action in ZONE_ACTIONS:
+            zone_module = load_module(ZONE_MODULE, profile)
+        else:
+            record_module = load_module(RECORD_MODULE, profile)
         if args.action == "create-zone":
-            zone_module.create_route53_zone(args.zone_name)
+            result = zone_module.create_route53_zone(args.zone_name)
         elif args.action == "list-zones":
-            list_route53_zones()
+            result = zone_module.list_route53_zones(args.concurrency)
         elif args.action == "delete-zone":
-            delete_hosted_zone(args.zone_id)
+            result = zone_module.delete_hosted_zone(args.zone_id)
         elif args.action == "create-record":
-            record_module.create_route53_record(
+            result = record_module.create_route53_record(
                     args.zone_id, args.record_name, args.record_type,
-                    args.record_value
+                    args.record_value, wait=args.wait
             )
         elif args.action == "list-records":
-            list_dns_records(args.zone_id)
+            result = record_module.list_dns_records(args.zone_id, args.type, args.name_prefix)
         elif args.action == "delete-record":
-            record_module.delete_route53_record(args.zone_id, args.record_name)
+            result = record_module.delete_route53_record(args.zone_id, args.record_name)
+        elif args.action == "import-records":
+            result = record_module.import_records(args.zone_id, args.file, args.format, args.wait)
+        elif args.action == "export-records":
+            result = record_module.export_records(args.zone_id, args.file, args.format)
         elif args.action == "update-record":
-            record_module.update_route53_record(
+            result = record_module.update_route53_record(
                 args.zone_id, args.record_name, args.record_type,
-                args.record_value
+                args.record_value, wait=args.wait
         )
+        elif args.action == "wait-changes":
+            latencies = record_module.wait_for_changes(args.change_id, args.timeout)
+            result = len(latencies) == len(set(args.change_id))
+
+    elif args.resource in ("plan", "apply"):
+        stack_module = load_module(STACK_MODULE, profile)
+        if args.resource == "plan":
+            result = stack_module.plan_stack(args.file, args.concurrency)
+        else:
+            result = stack_module.apply_stack(args.file, args.concurrency, args.wait, args.yes)
+
+    elif args.resource == "batch":
+        batch_module = importlib.import_module("common.batch")
+        if args.file == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(args.file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        result = batch_module.run_batch(lines, parser, dispatch, args.concurrency, args.yes)
+
+    elif args.resource == "daemon":
+        daemon_module = importlib.import_module("common.daemon")
+        if args.stop:
+            daemon_module.stop(args.socket)
+        else:
+            daemon_module.serve(parser, dispatch, args.socket)
     else:
         parser.print_help()
+    return result
+
+def main():
+    main_start = time.perf_counter()
+    # Hand plain resource commands to a running daemon, if there is one
+    if os.environ.get("AWSCLI_NO_DAEMON") is None:
+        from common import daemon
+        exit_code = daemon.forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+    parser = build_parser()
+
+    # --------------------------
+    # Parse and Dispatch
+    # --------------------------
+    args = timed("parse arguments", parser.parse_args)
+    configure_clients(args)
+    if args.refresh:
+        from common import inventory
+        inventory.set_refresh(True)
+    if args.rate_limit or args.no_rate_limit:
+        from common import ratelimit
+        ratelimit.configure(enabled=False if args.no_rate_limit else None,
+                            rates=dict(args.rate_limit or []))
+    trace = args.trace or args.trace_file
+    if trace:
+        tracing = timed("import boto3", importlib.import_module, "common.tracing")
+        tracing.enable()
+
+    try:
+        result = dispatch(args, parser, args.startup_profile or trace)
+    finally:
+        if args.startup_profile:
+            print_startup_profile(time.perf_counter() - main_start)
+        if trace:
+            for label, start, end in startup_timings:
+                tracing.add_span(label, start, end)
+            tracing.add_span("awscli", main_start, time.perf_counter(), "command")
+            tracing.print_summary()
+            if args.trace_file:
+                tracing.write_chrome_trace(args.trace_file)
+                print(f"Trace written to {args.trace_file}", file=sys.stderr)
+    if result is False:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
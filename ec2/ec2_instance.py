@@ -1,25 +1,92 @@
 from datetime import datetime
+import fnmatch
 import os
-import boto3
+import time
+from botocore.exceptions import ClientError
+from common import inventory
+from common.clients import get_client, get_session
+from common.output import ContextThreadPoolExecutor
 
-data = {}
-with open("ec2/configuration.txt", "r") as file:
-    for line in file:
-        key, value = line.strip().split(":", 1)
-        data[key.strip()] = value.strip()
-subnet_id = data.get("subnet-id")
-security_group = data.get("security-group")
+EC2_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(EC2_DIR, "configuration.txt")
+# describe_instances returns between 5 and 1000 results per page
+LIST_PAGE_SIZE = 1000
+# Polling interval bounds and timeout, in seconds, when waiting for instances
+WAIT_MIN_DELAY = 2
+WAIT_MAX_DELAY = 15
+WAIT_TIMEOUT = 600
+# Maximum values per DescribeInstances filter and instance IDs per
+# start/stop/terminate call
+FILTER_VALUES_LIMIT = 200
+ACTION_BATCH_SIZE = 1000
+MAX_RUNNING_INSTANCES = 2
+INSTANCE_ARCHES = {"t3.nano": "x86_64", "t4g.nano": "arm64"}
+USER_DATA_FILES = {"ubuntu": "user_data_ubuntu.sh", "amazon-linux": "user_data_amazon-linux.sh"}
+# SSM public parameters holding the latest AMI ID in every region. Canonical
+# names architectures amd64/arm64.
+AMI_PARAMETERS = {
+    "ubuntu": "/aws/service/canonical/ubuntu/server/24.04/stable/current/{arch}/hvm/ebs-gp3/ami-id",
+    "amazon-linux": "/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-{arch}",
+}
+UBUNTU_ARCHES = {"x86_64": "amd64", "arm64": "arm64"}
+# us-east-1 AMIs used when SSM cannot be read
+FALLBACK_AMIS = {
+    ("arm64", "ubuntu"): "ami-0a7a4e87939439934",
+    ("arm64", "amazon-linux"): "ami-0c518311db5640eff",
+    ("x86_64", "ubuntu"): "ami-04b4f1a9cf54c11d0",
+    ("x86_64", "amazon-linux"): "ami-085ad6ae776d8f09c",
+}
+# Per-instance Name tags go out side by side; a just-launched instance can
+# briefly be unknown to CreateTags, so NotFound is retried after these pauses
+TAG_CONCURRENCY = 8
+TAG_RETRY_DELAYS = [1, 2, 4, 8]
+STALE_PREFLIGHT_ERRORS = {"InvalidKeyPair.NotFound", "InvalidAMIID.NotFound", "InvalidAMIID.Unavailable"}
+# action: (client operation, progress verb, states the targets must be in,
+#          state recorded in the inventory afterwards)
+INSTANCE_ACTIONS = {
+    "start": ("start_instances", "Starting", ["stopped"], "pending"),
+    "stop": ("stop_instances", "Stopping", ["running"], "stopping"),
+    "delete": ("terminate_instances", "Terminating",
+               ["pending", "running", "stopping", "stopped"], "shutting-down"),
+}
 
-def get_or_create_key_pair_boto(pubkey_path: str) -> str:
+# State each action settles in, for --wait
+WAIT_STATES = {"start": "running", "stop": "stopped", "delete": "terminated"}
+LIVE_STATES = ["pending", "running", "stopping", "stopped"]
+
+_configuration = None
+
+def load_configuration():
+    # Read configuration.txt once, on first use, instead of at import time
+    global _configuration
+    if _configuration is None:
+        data = {}
+        with open(CONFIG_FILE, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                key, value = line.strip().split(":", 1)
+                data[key.strip()] = value.strip()
+        _configuration = data
+    return _configuration
+
+def key_name_for(pubkey_path):
     basename = os.path.basename(pubkey_path)
     # Ensure that we correctly strip ".pub" from the key name
     if basename.endswith(".pem.pub"):
-        key_name = basename[:-8]  # Remove ".pem.pub"
+        return basename[:-8]  # Remove ".pem.pub"
     elif basename.endswith(".pub"):
-        key_name = basename[:-4]  # Remove ".pub"
-    else:
-        key_name = basename  # Leave as is
-    ec2_client = boto3.client("ec2")
+        return basename[:-4]  # Remove ".pub"
+    return basename  # Leave as is
+
+def get_or_create_key_pair_boto(pubkey_path: str) -> str:
+    key_name = key_name_for(pubkey_path)
+    ec2_client = get_client("ec2")
+    # Key pairs are per region; a recent check is remembered on disk
+    cache_key = f"{ec2_client.meta.region_name}/{key_name}"
+    if inventory.get("keypair", cache_key):
+        print(f"Key pair '{key_name}' exists (cached).")
+        return key_name
     try:
         ec2_client.describe_key_pairs(KeyNames=[key_name])
         print(f"Key pair '{key_name}' exists.")
@@ -29,132 +96,109 @@ def get_or_create_key_pair_boto(pubkey_path: str) -> str:
             public_key = f.read().strip()
         ec2_client.import_key_pair(KeyName=key_name,
                                    PublicKeyMaterial=public_key)
+    inventory.put("keypair", cache_key, True)
 
     return key_name
 
-def delete_ec2(instance_id=None, instance_name=None):
-    ec2_client = boto3.client("ec2")
-    if not instance_id:
-        if instance_name:
-            response = ec2_client.describe_instances(
-                    Filters=[
-                        {"Name": "tag:Name", "Values": [instance_name]},
-                        {"Name": "tag:cli-managed", "Values": ["true"]}
-                    ]
-            )
-            instances = [
-                instance for reservation in response.get("Reservations", [])
-                for instance in reservation.get("Instances", [])
-            ]
-            if not instances:
-                print(f"No instance found with name {instance_name}.")
-                return
-            instance_id = instances[0]["InstanceId"]
-        else:
-            print("Error: Must specify either instance_id or instance_name.")
-            return
-
-    try:
-        ec2_client.terminate_instances(InstanceIds=[instance_id])
-        print(f"Terminating instance {instance_id}")
-    except Exception as e:
-        print(f"Error terminating instance: {e}")
-
-def start_ec2(instance_id=None, instance_name=None):
-    ec2_client = boto3.client("ec2")
-    if not instance_id:
-        if instance_name:
-            response = ec2_client.describe_instances(
-                    Filters=[
-                        {"Name": "tag:Name", "Values": [instance_name]},
-                        {"Name": "tag:cli-managed", "Values": ["true"]},
-                        {"Name": "instance-state-name", "Values": ["stopped"]}
-                    ]
-            )
-            instances = [
-                instance for reservation in response.get("Reservations", [])
-                for instance in reservation.get("Instances", [])
-            ]
-            if not instances:
-                print(f"No stopped instance found with name {instance_name}.")
-                return
-            instance_id = instances[0]["InstanceId"]
-        else:
-            print("Error: Must specify either instance_id or instance_name.")
-            return
-
+def resolve_ami(arch, distro):
+    # Latest AMI ID from the SSM public parameters, remembered on disk per
+    # region, arch and distro. The SSM client is only built on a cache miss.
+    region = get_session().region_name
+    cache_key = f"{region}/{arch}/{distro}"
+    cached = inventory.get("ami", cache_key)
+    if cached:
+        return cached[1]["id"]
+    ssm_client = get_client("ssm")
+    parameter = AMI_PARAMETERS[distro].format(arch=UBUNTU_ARCHES[arch] if distro == "ubuntu" else arch)
     try:
-        ec2_client.start_instances(InstanceIds=[instance_id])
-        print(f"Starting instance {instance_id}")
-    except Exception as e:
-        print(f"Error starting instance: {e}")
+        ami_id = ssm_client.get_parameter(Name=parameter)["Parameter"]["Value"]
+    except ssm_client.exceptions.ClientError as e:
+        fallback = FALLBACK_AMIS.get((arch, distro)) if region == "us-east-1" else None
+        if fallback is None:
+            print(f"Error resolving the {distro} {arch} AMI in {region}: {e}")
+            return None
+        print(f"Could not read {parameter} ({e}); using {fallback}.")
+        return fallback
+    inventory.put("ami", cache_key, True, {"id": ami_id})
+    return ami_id
 
-def create_ec2(cli_name, cli_instance_type, cli_ami, cli_pubkey_path):
-    # Ensure the public key file exists before proceeding
-    if not os.path.isfile(cli_pubkey_path):
-        print(f"Error: Public key file '{cli_pubkey_path}' does not exist.")
-        return
-    # Get or create the key pair
-    final_key_name = get_or_create_key_pair_boto(cli_pubkey_path)
-
-    # Determine the AMI and user data file based on instance type and AMI selection
-    if cli_instance_type == "t4g.nano":
-        if cli_ami == "ubuntu":
-            resolved_ami = "ami-0a7a4e87939439934"  # ARM Ubuntu
-            user_data_file = "./ec2/user_data_ubuntu.sh"
-        elif cli_ami == "amazon-linux":
-            resolved_ami = "ami-0c518311db5640eff"  # ARM Amazon Linux
-            user_data_file = "./ec2/user_data_amazon-linux.sh"
-        else:
-            print("Invalid AMI selection.")
-            return
-    elif cli_instance_type == "t3.nano":  # Assume t3.nano is x86_64
-        if cli_ami == "ubuntu":
-            resolved_ami = "ami-04b4f1a9cf54c11d0"  # x86_64 Ubuntu
-            user_data_file = "./ec2/user_data_ubuntu.sh"
-        elif cli_ami == "amazon-linux":
-            resolved_ami = "ami-085ad6ae776d8f09c"  # x86_64 Amazon Linux
-            user_data_file = "./ec2/user_data_amazon-linux.sh"
-        else:
-            print("Invalid AMI selection.")
-            return
-    else:
-        print("Invalid instance type selection.")
-        return
-
-    # Read and encode the user data script
-    with open(user_data_file, 'r') as f:
-        user_data_script = f.read()
+def read_user_data(distro):
+    with open(os.path.join(EC2_DIR, USER_DATA_FILES[distro]), 'r') as f:
+        return f.read()
 
-    max_instances = 2
-    ec2_client = boto3.client("ec2")
+def count_running_instances():
+    # Instances still starting count too: with --no-wait an earlier create
+    # may not have reached "running" yet
+    ec2_client = get_client("ec2")
     response = ec2_client.describe_instances(
             Filters=[
                 {"Name": "tag:cli-managed", "Values": ["true"]},
-                {"Name": "instance-state-name", "Values": ["running"]}
+                {"Name": "instance-state-name", "Values": ["pending", "running"]}
             ]
     )
-    running_instances = sum(
+    return sum(
             1 for reservation in response.get("Reservations", [])
             for _ in reservation.get("Instances", [])
     )
-    if running_instances >= max_instances:
+
+def create_ec2(cli_name, cli_instance_type, cli_ami, cli_pubkey_path, count=1, wait=True):
+    # Ensure the public key file exists before proceeding
+    if not os.path.isfile(cli_pubkey_path):
+        print(f"Error: Public key file '{cli_pubkey_path}' does not exist.")
+        return False
+    arch = INSTANCE_ARCHES.get(cli_instance_type)
+    if arch is None:
+        print("Invalid instance type selection.")
+        return False
+    if cli_ami not in USER_DATA_FILES:
+        print("Invalid AMI selection.")
+        return False
+
+    # The preflight steps are independent, so they run side by side. Key pair
+    # and AMI lookups are usually answered from the local cache.
+    with ContextThreadPoolExecutor(max_workers=4) as executor:
+        key_future = executor.submit(get_or_create_key_pair_boto, cli_pubkey_path)
+        ami_future = executor.submit(resolve_ami, arch, cli_ami)
+        user_data_future = executor.submit(read_user_data, cli_ami)
+        running_future = executor.submit(count_running_instances)
+        final_key_name = key_future.result()
+        resolved_ami = ami_future.result()
+        user_data_script = user_data_future.result()
+        running_instances = running_future.result()
+    if resolved_ami is None:
+        return False
+
+    if running_instances + count > MAX_RUNNING_INSTANCES:
         print(
-            "Maximum running instances is 2.\n"
-            "Cannot create a new instance if current running instances is 2 .")
-        return
+            f"Maximum running instances is {MAX_RUNNING_INSTANCES}.\n"
+            f"Cannot create {count} new instance(s) while {running_instances} are running or pending.")
+        return False
 
     # Create the new EC2 instance
-    resource_ec2 = boto3.resource("ec2")
+    configuration = load_configuration()
+    subnet_id = configuration.get("subnet-id")
+    security_group = configuration.get("security-group")
     date_created = datetime.now().strftime("%Y-%m-%d")
-    instance_name = f"{cli_name}"
+    instance_names = instance_names_for(cli_name, count)
+    tags = [
+        {"Key": "creation_date", "Value": date_created},
+        {"Key": "cli-managed", "Value": "true"},
+        {"Key": "owner", "Value": "itaimoshe"},
+    ]
+    if len(set(instance_names)) == 1:
+        tags.insert(0, {"Key": "Name", "Value": instance_names[0]})
 
-    print(f"Creating EC2 instance:")
-    try:
-        instances = resource_ec2.create_instances(
+    print(f"Creating {count} EC2 instance(s):")
+
+    ec2_client = get_client("ec2")
+
+    def launch():
+        # The whole group is launched with a single RunInstances call. The
+        # client is thread-safe, unlike a shared boto3 resource.
+        return ec2_client.run_instances(
                 ImageId=resolved_ami,
-                MinCount=1,
-                MaxCount=1,
+                MinCount=count,
+                MaxCount=count,
                 InstanceType=cli_instance_type,
                 KeyName=final_key_name,
                 NetworkInterfaces=[
@@ -168,77 +212,303 @@ def create_ec2(cli_name, cli_instance_type, cli_ami, cli_pubkey_path):
                 TagSpecifications=[
                     {
                         "ResourceType": "instance",
-                        "Tags": [
-                            {"Key": "Name", "Value": instance_name},
-                            {"Key": "creation_date", "Value": date_created},
-                            {"Key": "cli-managed", "Value": "true"},
-                            {"Key": "owner", "Value": "itaimoshe"},
-                        ]
+                        "Tags": tags
                     }
                 ],
                 UserData=user_data_script,
-        )
+        )["Instances"]
+
+    try:
+        try:
+            instances = launch()
+        except ec2_client.exceptions.ClientError as e:
+            # The cached key pair or AMI may have been deleted since it was
+            # looked up: forget both, resolve them again and retry once
+            if e.response["Error"]["Code"] not in STALE_PREFLIGHT_ERRORS:
+                raise
+            inventory.delete("keypair", f"{ec2_client.meta.region_name}/{final_key_name}")
+            inventory.delete("ami", f"{ec2_client.meta.region_name}/{arch}/{cli_ami}")
+            final_key_name = get_or_create_key_pair_boto(cli_pubkey_path)
+            resolved_ami = resolve_ami(arch, cli_ami)
+            instances = launch()
     except Exception as e:
         print(f"Error creating instance: {e}")
-        return
+        return False
 
-    # Wait until the instance is running and then display its details
-    instance = instances[0]
-    instance.wait_until_running()
-    instance.reload()
-    public_ip = instance.public_ip_address
+    instance_ids = [instance["InstanceId"] for instance in instances]
+    names_by_id = dict(zip(instance_ids, instance_names))
+    # The group is launched either way: a failed Name tag is reported below,
+    # and the instance is still waited on and recorded
+    tag_errors = tag_names(names_by_id) if len(set(instance_names)) > 1 else {}
 
-    print("EC2 Instance Created:")
-    print(f"  - Instance ID: {instance.id}")
-    print(f"  - Name: {instance_name}")
-    print(f"  - Public IP: {public_ip}")
+    # Wait for the whole group with one DescribeInstances call per poll.
+    # With wait=False the public IPs are not known yet; use `ec2 wait`.
+    results = wait_for_instances(instance_ids, "running") if wait else {}
 
-    return instance.id, instance_name, public_ip
+    print("EC2 Instance Created:" if count == 1 else "EC2 Instances Created:")
+    created = []
+    for instance_id in instance_ids:
+        seconds, instance = results.get(instance_id, (None, {}))
+        public_ip = instance.get("PublicIpAddress")
+        print(f"  - Instance ID: {instance_id}")
+        print(f"  - Name: {names_by_id[instance_id]}")
+        if wait:
+            print(f"  - Public IP: {public_ip}")
+        if seconds is not None:
+            print(f"  - Time to running: {seconds:.1f}s")
+        name = names_by_id[instance_id]
+        if instance_id in tag_errors:
+            print(f"  - Error tagging instance {instance_id} with Name {name}: {tag_errors[instance_id]}")
+            name = "Unknown"
+        created.append((instance_id, name, public_ip))
+        inventory.put("ec2", instance_id, True, instance_data(
+            name, instance.get("State", {}).get("Name", "pending"),
+            public_ip or "-", cli_instance_type))
 
-def list_ec2():
-    ec2_client = boto3.client("ec2")
-    try:
-        response = ec2_client.describe_instances(
-            Filters=[{"Name": "tag:cli-managed", "Values": ["true"]}]
-        )
-        print("EC2 Instances:")
+    if tag_errors:
+        return False
+    return created[0] if count == 1 else created
+
+def tag_names(names_by_id):
+    # Give each instance its own Name tag. Returns {instance ID: error} for
+    # the instances that could not be tagged.
+    ec2_client = get_client("ec2")
+
+    def tag(instance_id):
+        for delay in TAG_RETRY_DELAYS + [None]:
+            try:
+                ec2_client.create_tags(Resources=[instance_id],
+                                       Tags=[{"Key": "Name", "Value": names_by_id[instance_id]}])
+                return None
+            except ec2_client.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] != "InvalidInstanceID.NotFound" or delay is None:
+                    return e
+            except Exception as e:
+                return e
+            time.sleep(delay)
+
+    with ContextThreadPoolExecutor(max_workers=min(TAG_CONCURRENCY, len(names_by_id))) as executor:
+        errors = dict(zip(names_by_id, executor.map(tag, names_by_id)))
+    return {instance_id: error for instance_id, error in errors.items() if error is not None}
+
+def instance_names_for(name_template, count):
+    # "web-{i}" expands to web-1, web-2, ...; a plain name gets a "-<i>"
+    # suffix when more than one instance is launched
+    if "{i}" in name_template:
+        return [name_template.replace("{i}", str(i)) for i in range(1, count + 1)]
+    if count == 1:
+        return [name_template]
+    return [f"{name_template}-{i}" for i in range(1, count + 1)]
+
+def wait_for_instances(instance_ids, target_state, timeout=WAIT_TIMEOUT, names=None):
+    # Poll all instances with one DescribeInstances call per tick until each
+    # reaches target_state. The pause between ticks grows while nothing
+    # converges and drops back once instances start arriving. With names
+    # ({instance ID: name}) each instance is reported as it converges.
+    # Returns {instance ID: (seconds, instance data)}.
+    ec2_client = get_client("ec2")
+    started = time.monotonic()
+    pending = set(instance_ids)
+    results = {}
+    delay = WAIT_MIN_DELAY
+    while pending:
+        try:
+            response = ec2_client.describe_instances(InstanceIds=sorted(pending))
+        except ec2_client.exceptions.ClientError as e:
+            # Newly launched instances can briefly be unknown to DescribeInstances
+            if e.response["Error"]["Code"] != "InvalidInstanceID.NotFound":
+                print(f"Error checking instances: {e}")
+                return results
+            response = {}
+        converged = False
         for reservation in response.get("Reservations", []):
             for instance in reservation.get("Instances", []):
-                tags = {tag["Key"]: tag["Value"] for tag in instance.get("Tags", [])}
-                name_tag = tags.get("Name", "Unknown")
-                print(
-                    f" - Instance ID: {instance['InstanceId']} - Instance Name: {name_tag} - Instance State: {instance['State']['Name']}"
-                )
-    except ec2_client.exceptions.ClientError as e:
-        print("No EC2 instances found", e)
-        return
-
-def stop_ec2(instance_id=None, instance_name=None):
-    ec2_client = boto3.client("ec2")
-    if not instance_id:
-        if instance_name:
-            response = ec2_client.describe_instances(
-                    Filters=[
-                        {"Name": "tag:Name", "Values": [instance_name]},
-                        {"Name": "tag:cli-managed", "Values": ["true"]},
-                        {"Name": "instance-state-name", "Values": ["running"]}
-                    ]
+                instance_id = instance["InstanceId"]
+                if instance["State"]["Name"] == target_state and instance_id in pending:
+                    seconds = time.monotonic() - started
+                    results[instance_id] = (seconds, instance)
+                    pending.discard(instance_id)
+                    converged = True
+                    if names is not None:
+                        print(f"Instance {instance_id} ({names.get(instance_id, 'Unknown')}) "
+                              f"is {target_state} after {seconds:.1f}s", flush=True)
+        if not pending:
+            break
+        if time.monotonic() - started + delay > timeout:
+            print(f"Timed out after {timeout}s waiting for: {', '.join(sorted(pending))}")
+            break
+        time.sleep(delay)
+        delay = WAIT_MIN_DELAY if converged else min(delay * 1.5, WAIT_MAX_DELAY)
+    return results
+
+def instance_rows(filters, page_size=LIST_PAGE_SIZE):
+    # Stream (id, name, state, ip, type) for each instance, one page at a time
+    ec2_client = get_client("ec2")
+    paginator = ec2_client.get_paginator("describe_instances")
+    pages = paginator.paginate(Filters=filters,
+                               PaginationConfig={"PageSize": page_size})
+    for page in pages:
+        for reservation in page.get("Reservations", []):
+            for instance in reservation.get("Instances", []):
+                name_tag = next((tag["Value"] for tag in instance.get("Tags", [])
+                                 if tag["Key"] == "Name"), "Unknown")
+                yield (instance["InstanceId"], name_tag,
+                       instance["State"]["Name"],
+                       instance.get("PublicIpAddress", "-"),
+                       instance.get("InstanceType", "-"))
+
+def list_ec2(state=None, name=None):
+    # The EC2 client is only built (inside instance_rows) on a cache miss
+    cached = inventory.get_listing("ec2")
+    if cached is not None:
+        rows = [(instance_id, data["name"], data["state"], data["ip"], data["type"])
+                for instance_id, data in cached
+                if (not state or data["state"] == state)
+                and (not name or fnmatch.fnmatchcase(data["name"], name))]
+    else:
+        filters = [{"Name": "tag:cli-managed", "Values": ["true"]}]
+        if state:
+            filters.append({"Name": "instance-state-name", "Values": [state]})
+        if name:
+            filters.append({"Name": "tag:Name", "Values": [name]})
+        rows = instance_rows(filters)
+    listed = []
+    try:
+        print("EC2 Instances:")
+        for instance_id, name_tag, instance_state, public_ip, instance_type in rows:
+            listed.append((instance_id, name_tag, instance_state, public_ip, instance_type))
+            print(
+                f" - Instance ID: {instance_id} - Instance Name: {name_tag} - Instance State: {instance_state}"
+                f" - Public IP: {public_ip} - Type: {instance_type}",
+                flush=True
             )
-            instances = [
-                instance for reservation in response.get("Reservations", [])
-                for instance in reservation.get("Instances", [])
-            ]
-            if not instances:
-                print(f"No running instance found with name {instance_name}.")
-                return
-            instance_id = instances[0]["InstanceId"]
-        else:
-            print("Error: Must specify either instance_id or instance_name.")
-            return
+    except ClientError as e:
+        print("No EC2 instances found", e)
+        return False
+    # Only an unfiltered listing from AWS is complete enough to cache
+    if cached is None and not state and not name:
+        inventory.put_listing("ec2", [(row[0], instance_data(*row[1:])) for row in listed])
+
+def instance_data(name, state, public_ip, instance_type):
+    return {"name": name, "state": state, "ip": public_ip, "type": instance_type}
 
+def tag_filters(tags):
+    # Turn ["env=dev", "team=web"] selectors into DescribeInstances filters
+    filters = []
+    for tag in tags or []:
+        key, _, value = tag.partition("=")
+        filters.append({"Name": f"tag:{key}", "Values": [value or "*"]})
+    return filters
+
+def resolve_instances(instance_ids=None, instance_names=None, tags=None, states=None):
+    # Resolve every target with as few filtered DescribeInstances calls as
+    # possible: one for IDs and/or one for names, plus extra pages only when
+    # more than FILTER_VALUES_LIMIT values are given.
+    base_filters = [{"Name": "tag:cli-managed", "Values": ["true"]}] + tag_filters(tags)
+    if states:
+        base_filters.append({"Name": "instance-state-name", "Values": states})
+    queries = []
+    for filter_name, values in (("instance-id", instance_ids), ("tag:Name", instance_names)):
+        values = list(values or [])
+        for start in range(0, len(values), FILTER_VALUES_LIMIT):
+            queries.append(base_filters + [{"Name": filter_name,
+                                            "Values": values[start:start + FILTER_VALUES_LIMIT]}])
+    if not queries and tags:
+        queries.append(base_filters)
+    resolved = {}
+    for filters in queries:
+        for row in instance_rows(filters):
+            resolved[row[0]] = row[1]
+    return resolved
+
+def report_unmatched(targets, instance_ids=None, instance_names=None, state_text=""):
+    # Print each requested ID or name that resolved to no instance; returns
+    # how many there were. Names may hold the same wildcards as the filter.
+    names = set(targets.values())
+    missing = [f"ID {instance_id}" for instance_id in instance_ids or []
+               if instance_id not in targets]
+    missing += [f"name {name}" for name in instance_names or []
+                if not any(fnmatch.fnmatchcase(found, name) for found in names)]
+    for target in missing:
+        print(f"No {state_text}CLI-managed instance found with {target}.")
+    return len(missing)
+
+def act_on_instances(action, instance_ids=None, instance_names=None, tags=None, wait=False):
+    operation, verb, states, next_state = INSTANCE_ACTIONS[action]
+    if not (instance_ids or instance_names or tags):
+        print("Error: Must specify instance IDs, instance names or tag selectors.")
+        return False
+    ec2_client = get_client("ec2")
     try:
-        ec2_client.stop_instances(InstanceIds=[instance_id])
-        print(f"Stopping instance {instance_id}")
-    except Exception as e:
-        print(f"Error stopping instance: {e}")
+        targets = resolve_instances(instance_ids, instance_names, tags, states)
+    except ec2_client.exceptions.ClientError as e:
+        print(f"Error resolving instances: {e}")
+        return False
+    state_text = f"{states[0]} " if len(states) == 1 else ""
+    missing = report_unmatched(targets, instance_ids, instance_names, state_text)
+    if not targets:
+        if not missing:
+            print(f"No {state_text}CLI-managed instances matched.")
+        return False
+
+    # One batched call per chunk instead of one call per instance
+    target_ids = sorted(targets)
+    acted = []
+    for start in range(0, len(target_ids), ACTION_BATCH_SIZE):
+        chunk = target_ids[start:start + ACTION_BATCH_SIZE]
+        try:
+            getattr(ec2_client, operation)(InstanceIds=chunk)
+            for instance_id in chunk:
+                inventory.update("ec2", instance_id, state=next_state)
+                print(f"{verb} instance {instance_id} ({targets[instance_id]})")
+            acted.extend(chunk)
+        except Exception as e:
+            print(f"Error {verb.lower()} instances {', '.join(chunk)}: {e}")
+    if wait and acted:
+        results = wait_for_instances(acted, WAIT_STATES[action], names=targets)
+        record_states(results)
+        if len(results) < len(acted):
+            return False
+    return target_ids if len(acted) == len(target_ids) and not missing else False
+
+def record_states(results):
+    for instance_id, (_, instance) in results.items():
+        inventory.update("ec2", instance_id, state=instance["State"]["Name"],
+                         ip=instance.get("PublicIpAddress", "-"))
+
+def wait_ec2(instance_ids=None, instance_names=None, tags=None, state="running",
+             timeout=WAIT_TIMEOUT):
+    if not (instance_ids or instance_names or tags):
+        print("Error: Must specify instance IDs, instance names or tag selectors.")
+        return False
+    ec2_client = get_client("ec2")
+    # Terminated instances linger in DescribeInstances; only count them when
+    # waiting for termination, so an old namesake does not block the wait
+    states = None if state == "terminated" else LIVE_STATES
+    try:
+        targets = resolve_instances(instance_ids, instance_names, tags, states)
+    except ec2_client.exceptions.ClientError as e:
+        print(f"Error resolving instances: {e}")
+        return False
+    missing = report_unmatched(targets, instance_ids, instance_names)
+    if not targets:
+        if not missing:
+            print("No CLI-managed instances matched.")
+        return False
+    print(f"Waiting for {len(targets)} instance(s) to be {state}...")
+    results = wait_for_instances(sorted(targets), state, timeout, names=targets)
+    record_states(results)
+    if len(results) < len(targets) or missing:
+        return False
+    slowest = max(seconds for seconds, _ in results.values())
+    print(f"All {len(targets)} instance(s) are {state} after {slowest:.1f}s")
+    return results
+
+def start_ec2(instance_ids=None, instance_names=None, tags=None, wait=False):
+    return act_on_instances("start", instance_ids, instance_names, tags, wait)
+
+def stop_ec2(instance_ids=None, instance_names=None, tags=None, wait=False):
+    return act_on_instances("stop", instance_ids, instance_names, tags, wait)
 
+def delete_ec2(instance_ids=None, instance_names=None, tags=None, wait=False):
+    return act_on_instances("delete", instance_ids, instance_names, tags, wait)
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime
+from common.clients import get_client
+
+# Route53 ChangeResourceRecordSets limits per request. UPSERT changes count
+# twice against both limits.
+MAX_RECORDS_PER_BATCH = 1000
+MAX_VALUE_CHARS_PER_BATCH = 32000
+
+# GetChange polling: seconds between sweeps and overall timeout. The calls
+# themselves are paced by the shared Route53 rate limiter.
+WAIT_MIN_DELAY = 2
+WAIT_MAX_DELAY = 30
+WAIT_TIMEOUT = 900
+
+def change_cost(change):
+    record_set = change["ResourceRecordSet"]
+    values = [r.get("Value", "") for r in record_set.get("ResourceRecords", [])]
+    # Alias records carry no ResourceRecords but still occupy a slot
+    records = max(len(values), 1)
+    chars = sum(len(value) for value in values)
+    if change["Action"] == "UPSERT":
+        return records * 2, chars * 2
+    return records, chars
+
+def batch_changes(changes):
+    # Pack changes into as few ChangeBatches as the request limits allow
+    batch, batch_records, batch_chars = [], 0, 0
+    for change in changes:
+        records, chars = change_cost(change)
+        if batch and (batch_records + records > MAX_RECORDS_PER_BATCH
+                      or batch_chars + chars > MAX_VALUE_CHARS_PER_BATCH):
+            yield batch
+            batch, batch_records, batch_chars = [], 0, 0
+        batch.append(change)
+        batch_records += records
+        batch_chars += chars
+    if batch:
+        yield batch
+
+def submit_batch(zone_id, batch):
+    # Submit one ChangeBatch. If Route53 rejects it, split it in half and
+    # retry each side so a single bad record does not block the others.
+    # Returns (change IDs, failed changes with their errors).
+    client = get_client("route53")
+    try:
+        response = client.change_resource_record_sets(
+            HostedZoneId=zone_id,
+            ChangeBatch={"Changes": batch}
+        )
+        return [response["ChangeInfo"]["Id"]], []
+    except client.exceptions.ClientError as e:
+        if len(batch) == 1:
+            return [], [(batch[0], e)]
+    middle = len(batch) // 2
+    left_ids, left_failed = submit_batch(zone_id, batch[:middle])
+    right_ids, right_failed = submit_batch(zone_id, batch[middle:])
+    return left_ids + right_ids, left_failed + right_failed
+
+def submit_changes(zone_id, changes):
+    # Stream changes into maximal batches; returns (change IDs, failures)
+    change_ids, failed = [], []
+    for batch in batch_changes(changes):
+        print(f"Submitting {len(batch)} change(s) to zone {zone_id}...")
+        batch_ids, batch_failed = submit_batch(zone_id, batch)
+        change_ids.extend(batch_ids)
+        failed.extend(batch_failed)
+    return change_ids, failed
+
+def wait_for_changes(change_ids, timeout=WAIT_TIMEOUT):
+    # Poll GetChange for every pending change until all are INSYNC. The pause
+    # between sweeps grows while nothing converges and shrinks again once
+    # changes start completing. A change whose GetChange call fails stays
+    # pending and is tried again, unless Route53 does not know it at all.
+    # Returns {change ID: latency} for the changes that reached INSYNC.
+    client = get_client("route53")
+    pending = list(dict.fromkeys(change_ids))
+    latencies = {}
+    errors, failed = {}, {}
+    delay = WAIT_MIN_DELAY
+    started = time.monotonic()
+    print(f"Waiting for {len(pending)} change(s) to reach INSYNC...")
+    while pending:
+        still_pending = []
+        converged = False
+        for change_id in pending:
+            try:
+                change_info = client.get_change(Id=change_id)["ChangeInfo"]
+            except client.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchChange":
+                    failed[change_id] = e
+                else:
+                    errors[change_id] = e
+                    still_pending.append(change_id)
+                continue
+            errors.pop(change_id, None)
+            if change_info["Status"] != "INSYNC":
+                still_pending.append(change_id)
+                continue
+            submitted_at = change_info["SubmittedAt"]
+            latency = (datetime.now(submitted_at.tzinfo) - submitted_at).total_seconds()
+            latencies[change_id] = latency
+            converged = True
+            print(f"Change {change_id} is INSYNC ({latency:.1f}s after submission)", flush=True)
+        pending = still_pending
+        if not pending:
+            break
+        if time.monotonic() - started + delay > timeout:
+            print(f"Timed out after {timeout}s with {len(pending)} change(s) still PENDING:")
+            for change_id in pending:
+                if change_id in errors:
+                    print(f" - {change_id} (last check failed: {errors[change_id]})")
+                else:
+                    print(f" - {change_id}")
+            break
+        time.sleep(delay)
+        delay = WAIT_MIN_DELAY if converged else min(delay * 2, WAIT_MAX_DELAY)
+    for change_id, error in failed.items():
+        print(f"Error checking change {change_id}: {error}")
+    return latencies
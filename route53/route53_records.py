@@ -1,7 +1,12 @@
-import boto3
-
-def create_route53_record(zone_id, record_name, record_type, record_value, ttl=300):
-    client = boto3.client('route53')
+import csv
+import sys
+from common.clients import get_client
+from route53.route53_changes import submit_changes, wait_for_changes
+from route53.route53_zonefile import (CSV_FIELDS, detect_format,
+                                      read_record_sets, write_record_set)
+
+def create_route53_record(zone_id, record_name, record_type, record_value, ttl=300, wait=False):
+    client = get_client("route53")
     response = client.change_resource_record_sets(
         HostedZoneId=zone_id,
         ChangeBatch={
@@ -21,30 +26,61 @@ def create_route53_record(zone_id, record_name, record_type, record_value, ttl=3
     status = change_info.get("Status")
     print(f"Record {record_name} ({record_type}) created in zone {zone_id}")
     print(f"Change ID: {change_id}, Status: {status}")
-
-def list_dns_records(zone_id):
-    client = boto3.client('route53')
+    if wait and not wait_for_changes([change_id]):
+        return False
+    return change_id
+
+def in_subtree(name, root):
+    # True if name equals root or is one of its subdomains
+    name = name.rstrip(".").lower()
+    return name == root or name.endswith("." + root)
+
+def iter_record_sets(zone_id, record_type=None, name_prefix=None):
+    # Route53 sorts records by name with the labels reversed, so a name and
+    # all of its subdomains are contiguous. Start the scan at that name and
+    # stop at the first record outside it instead of reading the whole zone.
+    client = get_client("route53")
+    params = {"HostedZoneId": zone_id}
+    root = None
+    if name_prefix:
+        root = name_prefix.rstrip(".").lower()
+        params["StartRecordName"] = name_prefix
+        if record_type:
+            params["StartRecordType"] = record_type
+    paginator = client.get_paginator('list_resource_record_sets')
+    for page in paginator.paginate(**params):
+        for record in page.get('ResourceRecordSets', []):
+            if root and not in_subtree(record.get('Name'), root):
+                return
+            if record_type and record.get('Type') != record_type:
+                continue
+            yield record
+
+def list_dns_records(zone_id, record_type=None, name_prefix=None):
+    found = 0
     try:
-        response = client.list_resource_record_sets(HostedZoneId=zone_id)
-        records = response.get('ResourceRecordSets', [])
-
-        if not records:
-            print(f"No DNS records found in zone {zone_id}.")
-            return
-
-        print(f"DNS records in zone {zone_id}:")
-        for record in records:
+        for record in iter_record_sets(zone_id, record_type, name_prefix):
+            if not found:
+                print(f"DNS records in zone {zone_id}:")
+            found += 1
             name = record.get('Name')
-            record_type = record.get('Type')
             ttl = record.get('TTL', 'N/A')
-            values = ', '.join([r.get('Value') for r in
-                                record.get('ResourceRecords', [])])
-            print(f" -NAME: {name} -TYPE: {record_type}: TTL={ttl}, Value(s): {values}")
+            if 'AliasTarget' in record:
+                values = f"ALIAS {record['AliasTarget']['DNSName']}"
+            else:
+                values = ', '.join(r.get('Value') for r in
+                                   record.get('ResourceRecords', []))
+            print(f" -NAME: {name} -TYPE: {record.get('Type')}: TTL={ttl}, Value(s): {values}",
+                  flush=True)
     except Exception as e:
         print(f"Error listing DNS records for hosted zone {zone_id}: {e}")
+        return False
+
+    if not found:
+        print(f"No DNS records found in zone {zone_id}.")
 
-def update_route53_record(zone_id, record_name, record_type, record_value, ttl=300):
-    client = boto3.client('route53')
+def update_route53_record(zone_id, record_name, record_type, record_value, ttl=300, wait=False):
+    client = get_client("route53")
 
     # Fetch existing records in the hosted zone
     response = client.list_resource_record_sets(HostedZoneId=zone_id)
@@ -63,7 +99,7 @@ def update_route53_record(zone_id, record_name, record_type, record_value, ttl=3
 
     if not target_record:
         print(f"Error: Record {record_name} of type {record_type} does not exist in zone {zone_id}.")
-        return
+        return False
 
     # Perform update using UPSERT (update the record with new value/TTL)
     response = client.change_resource_record_sets(
@@ -86,10 +122,13 @@ def update_route53_record(zone_id, record_name, record_type, record_value, ttl=3
 
     print(f"Record {record_name} ({record_type}) updated in zone {zone_id}")
     print(f"Change ID: {change_id}, Status: {status}")
+    if wait and not wait_for_changes([change_id]):
+        return False
+    return change_id
 
 
 def delete_route53_record(zone_id, record_name):
-    client = boto3.client('route53')
+    client = get_client("route53")
 
     # Fetch existing records in the hosted zone
     response = client.list_resource_record_sets(HostedZoneId=zone_id)
@@ -117,6 +156,69 @@ def delete_route53_record(zone_id, record_name):
                 }
             )
             print(f"Record {record_name} ({record_type}) deleted from zone {zone_id}")
-            return
+            return True
+
+    print(f"Error: Record {record_name} not found in zone {zone_id}")
+    return False
 
-    print(f"Error: Record {record_name} not found in zone {zone_id}")
\ No newline at end of file
+def import_records(zone_id, file_path, file_format=None, wait=False):
+    client = get_client("route53")
+    file_format = file_format or detect_format(file_path)
+    try:
+        origin = client.get_hosted_zone(Id=zone_id)['HostedZone']['Name']
+    except Exception as e:
+        print(f"Error reading hosted zone {zone_id}: {e}")
+        return False
+
+    # SOA and apex NS records are owned by Route53 and cannot be replaced
+    def upserts(record_sets):
+        for record_set in record_sets:
+            if record_set['Type'] == 'SOA' or (
+                    record_set['Type'] == 'NS'
+                    and record_set['Name'].lower() == origin.lower()):
+                continue
+            yield {"Action": "UPSERT", "ResourceRecordSet": record_set}
+
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            record_sets = read_record_sets(f, file_format, origin)
+            change_ids, failed = submit_changes(zone_id, upserts(record_sets))
+    except ValueError as e:
+        # Batches before the problem were already submitted; UPSERTs make a
+        # second import of the fixed file safe
+        print(f"Error importing {file_path}: {e}")
+        return False
+    except OSError as e:
+        print(f"Error reading {file_path}: {e}")
+        return False
+
+    for change, error in failed:
+        record = change["ResourceRecordSet"]
+        print(f"Error importing record {record.get('Name')} ({record.get('Type')}): {error}")
+    print(f"Imported records into zone {zone_id} in {len(change_ids)} change batch(es)")
+    for change_id in change_ids:
+        print(f"Change ID: {change_id}")
+    if wait and change_ids and len(wait_for_changes(change_ids)) < len(set(change_ids)):
+        return False
+    return False if failed else change_ids
+
+def export_records(zone_id, file_path=None, file_format=None):
+    client = get_client("route53")
+    if file_format is None:
+        file_format = detect_format(file_path) if file_path else "bind"
+    out = open(file_path, 'w', encoding='utf-8', newline='') if file_path else sys.stdout
+    csv_writer = csv.writer(out) if file_format == "csv" else None
+    try:
+        if csv_writer:
+            csv_writer.writerow(CSV_FIELDS)
+        # Write each page as it arrives so the zone is never held in memory
+        paginator = client.get_paginator('list_resource_record_sets')
+        for page in paginator.paginate(HostedZoneId=zone_id):
+            for record_set in page.get('ResourceRecordSets', []):
+                write_record_set(out, record_set, file_format, csv_writer)
+    except Exception as e:
+        print(f"Error exporting records for hosted zone {zone_id}: {e}", file=sys.stderr)
+        return False
+    finally:
+        if file_path:
+            out.close()
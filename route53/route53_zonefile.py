@@ -0,0 +1,216 @@
+import csv
+import json
+import os
+import re
+
+FORMATS = ["bind", "json", "csv"]
+DEFAULT_TTL = 300
+CSV_FIELDS = ["name", "type", "ttl", "value"]
+# Positions of domain names within the record data, resolved against $ORIGIN
+TARGET_FIELDS = {"CNAME": [0], "NS": [0], "PTR": [0], "MX": [1], "SRV": [3]}
+# A quoted string (kept whole, spacing included) or a run of non-blanks
+TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"?|[^\s"]+')
+# A TTL in seconds or with BIND unit suffixes, e.g. 3600, 1h or 1h30m
+TTL = re.compile(r"^(?:\d+|(?:\d+[smhdw])+)$", re.IGNORECASE)
+TTL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+CLASSES = ("IN", "CH", "HS")
+
+def detect_format(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".json", ".jsonl"):
+        return "json"
+    if extension == ".csv":
+        return "csv"
+    return "bind"
+
+def absolute_name(name, origin):
+    # Resolve "@" and relative owner names against the zone origin
+    if name == "@":
+        return origin
+    if name.endswith("."):
+        return name
+    return f"{name}.{origin}"
+
+def unquoted(line):
+    # Yield (index, char, inside quotes) for each character of line
+    in_quotes = False
+    escaped = False
+    for index, char in enumerate(line):
+        yield index, char, in_quotes
+        if escaped:
+            escaped = False
+        elif char == "\\" and in_quotes:
+            escaped = True
+        elif char == '"':
+            in_quotes = not in_quotes
+
+def strip_comment(line):
+    # Drop a trailing ";" comment, ignoring semicolons inside quoted strings
+    for index, char, in_quotes in unquoted(line):
+        if char == ";" and not in_quotes:
+            return line[:index]
+    return line
+
+def parse_ttl(token):
+    if token.isdigit():
+        return int(token)
+    return sum(int(number) * TTL_UNITS[unit.lower()]
+               for number, unit in re.findall(r"(\d+)([smhdwSMHDW])", token))
+
+def logical_lines(lines):
+    # Join records split across lines with parentheses, e.g. SOA records.
+    # Parentheses inside quoted strings are data, not grouping. Yields
+    # (number of the first line, text).
+    pending = ""
+    depth = 0
+    start = 0
+    for number, line in enumerate(lines, 1):
+        line = strip_comment(line.rstrip("\n"))
+        chars = []
+        for _, char, in_quotes in unquoted(line):
+            if char in "()" and not in_quotes:
+                depth += 1 if char == "(" else -1
+                if depth < 0:
+                    raise ValueError(f"line {number}: unbalanced ')'")
+                char = " "
+            chars.append(char)
+        line = "".join(chars)
+        if not pending:
+            start = number
+        pending = f"{pending} {line}" if pending else line
+        if depth == 0:
+            if pending.strip():
+                yield start, pending
+            pending = ""
+    if depth:
+        raise ValueError(f"line {start}: '(' is never closed")
+
+def parse_bind(lines, origin):
+    # Yield (name, type, ttl, value) tuples from a BIND zone file. Malformed
+    # lines and unsupported directives raise ValueError with the line number.
+    ttl = DEFAULT_TTL
+    last_name = origin
+    for number, line in logical_lines(lines):
+        fields = TOKEN.findall(line)
+        if fields[0].startswith("$"):
+            directive = fields[0].upper()
+            if directive not in ("$ORIGIN", "$TTL"):
+                raise ValueError(f"line {number}: {fields[0]} is not supported"
+                                 + ("; import the included file on its own"
+                                    if directive == "$INCLUDE" else ""))
+            if len(fields) < 2:
+                raise ValueError(f"line {number}: {fields[0]} needs a value")
+            if directive == "$ORIGIN":
+                origin = absolute_name(fields[1], origin)
+            elif TTL.match(fields[1]):
+                ttl = parse_ttl(fields[1])
+            else:
+                raise ValueError(f"line {number}: invalid $TTL {fields[1]}")
+            continue
+        if line[0].isspace():
+            name = last_name
+        else:
+            name = absolute_name(fields.pop(0), origin)
+        last_name = name
+        record_ttl = ttl
+        # TTL and class may appear in either order before the type
+        while fields and (TTL.match(fields[0]) or fields[0].upper() in CLASSES):
+            token = fields.pop(0)
+            if TTL.match(token):
+                record_ttl = parse_ttl(token)
+        if len(fields) < 2:
+            raise ValueError(f"line {number}: expected a record type and value: {line.strip()}")
+        record_type = fields.pop(0).upper()
+        for position in TARGET_FIELDS.get(record_type, []):
+            if position >= len(fields):
+                raise ValueError(f"line {number}: {record_type} record is missing fields: {line.strip()}")
+            fields[position] = absolute_name(fields[position], origin)
+        yield name, record_type, record_ttl, " ".join(fields)
+
+def parse_csv(lines, origin):
+    reader = csv.DictReader(lines, fieldnames=CSV_FIELDS)
+    for row in reader:
+        if row["name"] == "name" and row["type"] == "type":
+            continue  # header row
+        if not any(row.values()):
+            continue
+        if not row["name"] or not row["type"] or row["value"] is None:
+            raise ValueError(f"line {reader.line_num}: expected name,type,ttl,value")
+        if row["ttl"] and not row["ttl"].isdigit():
+            raise ValueError(f"line {reader.line_num}: invalid TTL {row['ttl']}")
+        ttl = int(row["ttl"]) if row["ttl"] else DEFAULT_TTL
+        yield absolute_name(row["name"], origin), row["type"].upper(), ttl, row["value"]
+
+def parse_json(lines, origin):
+    # JSON Lines: one Route53 ResourceRecordSet per line, as written by
+    # export. A JSON array of record sets is read whole.
+    lines = iter(lines)
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        if line.lstrip().startswith("["):
+            try:
+                record_sets = json.loads(line + "".join(lines))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid JSON array: {e}") from None
+            if not isinstance(record_sets, list):
+                raise ValueError("expected a JSON array of record sets")
+            for index, record_set in enumerate(record_sets):
+                yield checked_record_set(record_set, f"array item {index}")
+            return
+        try:
+            record_set = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON: {e}") from None
+        yield checked_record_set(record_set, f"line {number}")
+
+def checked_record_set(record_set, where):
+    if not isinstance(record_set, dict) or "Name" not in record_set or "Type" not in record_set:
+        raise ValueError(f"{where}: expected a record set object with Name and Type")
+    return record_set
+
+def read_record_sets(lines, file_format, origin):
+    # Stream record sets out of a zone file. JSON entries are already complete
+    # record sets; BIND and CSV rows are grouped into multi-value RRsets by
+    # name and type, since an UPSERT replaces the whole set. Rows must be
+    # grouped by owner name, as zone files and export output are: a name's
+    # record sets are emitted as soon as the next name starts, and a name
+    # that comes back later raises ValueError instead of replacing them.
+    if file_format == "json":
+        yield from parse_json(lines, origin)
+        return
+    parse = parse_bind if file_format == "bind" else parse_csv
+    current, record_sets, finished = None, {}, set()
+    for name, record_type, ttl, value in parse(lines, origin):
+        if name.lower() != current:
+            yield from record_sets.values()
+            finished.add(current)
+            current, record_sets = name.lower(), {}
+            if current in finished:
+                raise ValueError(f"records for {name} are not grouped together; "
+                                 f"group the file by name and import it again")
+        record_set = record_sets.get(record_type)
+        if record_set is None:
+            record_set = {"Name": name, "Type": record_type, "TTL": ttl,
+                          "ResourceRecords": []}
+            record_sets[record_type] = record_set
+        record_set["ResourceRecords"].append({"Value": value})
+    yield from record_sets.values()
+
+def write_record_set(out, record_set, file_format, csv_writer=None):
+    if file_format == "json":
+        out.write(json.dumps(record_set) + "\n")
+        return
+    name = record_set["Name"]
+    record_type = record_set["Type"]
+    if "AliasTarget" in record_set:
+        target = record_set["AliasTarget"]["DNSName"]
+        if file_format == "bind":
+            out.write(f"; ALIAS {name} {record_type} -> {target}\n")
+        return
+    ttl = record_set.get("TTL", DEFAULT_TTL)
+    for record in record_set.get("ResourceRecords", []):
+        if file_format == "bind":
+            out.write(f"{name}\t{ttl}\tIN\t{record_type}\t{record['Value']}\n")
+        else:
+            csv_writer.writerow([name, record_type, ttl, record["Value"]])
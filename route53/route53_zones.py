@@ -1,7 +1,14 @@
-import boto3
+from common import inventory
+from common.clients import get_client
+from common.output import ContextThreadPoolExecutor
+from route53.route53_changes import submit_changes
+
+# ListTagsForResources accepts at most 10 resource IDs per call
+TAG_BATCH_SIZE = 10
+TAG_CONCURRENCY = 4
 
 def create_route53_zone(zone_name):
-    client = boto3.client('route53')
+    client = get_client("route53")
     response = client.create_hosted_zone(
             Name=zone_name,
             CallerReference=str(hash(zone_name)),
@@ -15,85 +22,125 @@ def create_route53_zone(zone_name):
             ResourceId=zone_id,
             AddTags=[{"Key": "cli-managed", "Value": "true"}]
     )
+    inventory.put('route53', zone_id, True,
+                  {'Id': response['HostedZone']['Id'], 'Name': response['HostedZone']['Name']})
     print("Host name Created:")
     print(
         f"Hosted zone {zone_name} created with ID {response['HostedZone']['Id']}")
+    return zone_id
+
+def zone_id_of(zone):
+    return zone['Id'].split('/')[-1]
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-def list_route53_zones():
-    client = boto3.client('route53')
-    zones = client.list_hosted_zones()['HostedZones']
-    cli_managed_zones = [z for z in zones if any(
-            tag['Key'] == 'cli-managed' and tag['Value'] == 'true' for tag in
-            client.list_tags_for_resource(
-                    ResourceType='hostedzone',
-                    ResourceId=z['Id'].split('/')[-1])['ResourceTagSet'][
-                'Tags'])]
+def managed_zone_ids(zone_ids):
+    # One ListTagsForResources call covers up to TAG_BATCH_SIZE zones
+    client = get_client('route53')
+    response = client.list_tags_for_resources(
+            ResourceType='hostedzone', ResourceIds=zone_ids)
+    return {tag_set['ResourceId'] for tag_set in response['ResourceTagSets']
+            if any(tag['Key'] == 'cli-managed' and tag['Value'] == 'true'
+                   for tag in tag_set.get('Tags', []))}
+
+def list_route53_zones(concurrency=TAG_CONCURRENCY):
+    cached = inventory.get_listing('route53')
+    if cached is not None:
+        print("Host zones:")
+        for _, zone in cached:
+            print(f"-Zone ID: {zone['Id']} - Host Name: {zone['Name']}")
+        return
+
+    client = get_client('route53')
+    paginator = client.get_paginator('list_hosted_zones')
+    managed_zones, unmanaged_ids = [], []
     print("Host zones:")
-    for zone in cli_managed_zones:
-        print(f"-Zone ID: {zone['Id']} - Host Name: {zone['Name']}")
+    # Tag chunks from each page are looked up in parallel; a small pool keeps
+    # us under Route53's per-account request rate.
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for page in paginator.paginate():
+            zones = page['HostedZones']
+            chunks = list(chunked(zones, TAG_BATCH_SIZE))
+            results = executor.map(
+                    lambda chunk: managed_zone_ids([zone_id_of(z) for z in chunk]),
+                    chunks)
+            for chunk, managed in zip(chunks, results):
+                for zone in chunk:
+                    if zone_id_of(zone) in managed:
+                        managed_zones.append((zone_id_of(zone),
+                                              {'Id': zone['Id'], 'Name': zone['Name']}))
+                        print(f"-Zone ID: {zone['Id']} - Host Name: {zone['Name']}")
+                    else:
+                        unmanaged_ids.append(zone_id_of(zone))
+    inventory.put_listing('route53', managed_zones, unmanaged_ids)
+
+def is_cli_managed_zone(zone_id):
+    cached = inventory.get('route53', zone_id)
+    if cached is not None:
+        return cached[0]
+    client = get_client("route53")
+    tags_response = client.list_tags_for_resource(
+            ResourceType='hostedzone',
+            ResourceId=zone_id
+    )
+    tags = tags_response.get('ResourceTagSet', {}).get('Tags', [])
+    cli_managed = any(
+            tag.get('Key') == 'cli-managed' and tag.get('Value') == 'true'
+            for tag in tags)
+    inventory.put('route53', zone_id, cli_managed)
+    if cli_managed:
+        # A managed zone the cached listing did not have: list again next time
+        inventory.invalidate_listing('route53')
+    return cli_managed
 
 def delete_hosted_zone(zone_id):
-    client = boto3.client('route53')
+    client = get_client("route53")
     # Check if the hosted zone is managed by the CLI
     try:
-        tags_response = client.list_tags_for_resource(
-                ResourceType='hostedzone',
-                ResourceId=zone_id
-        )
-        tags = tags_response.get('ResourceTagSet', {}).get('Tags', [])
-        cli_managed = any(
-                tag.get('Key') == 'cli-managed' and tag.get('Value') == 'true'
-                for tag in tags)
-
+        cli_managed = is_cli_managed_zone(zone_id)
     except Exception as e:
         print(f"Error retrieving tags for hosted zone {zone_id}: {e}")
-        return
+        return False
 
     if not cli_managed:
         print(
             f"Error: Hosted zone {zone_id} is not managed by this CLI. Deletion aborted.")
-        return
+        return False
 
     # Confirm deletion with the user
     confirmation = input(
         f"Are you sure you want to delete hosted zone {zone_id} ?\nThis will delete all records permanently. (y/n):")
     if confirmation.lower() != "y":
         print("Deletion cancelled.")
-        return
-    # List all records in the zone
+        return False
+    # Page through every record, skipping the default NS and SOA records which
+    # AWS requires to remain, and delete them in as few batches as possible.
+    def deletions():
+        paginator = client.get_paginator('list_resource_record_sets')
+        for page in paginator.paginate(HostedZoneId=zone_id):
+            for record in page.get('ResourceRecordSets', []):
+                if record.get('Type') not in ['NS', 'SOA']:
+                    yield {"Action": "DELETE", "ResourceRecordSet": record}
+
     try:
-        response = client.list_resource_record_sets(HostedZoneId=zone_id)
-        records = response.get('ResourceRecordSets', [])
+        _, failed = submit_changes(zone_id, deletions())
     except Exception as e:
         print(f"Error listing records for hosted zone {zone_id}: {e}")
-        return
-
-    # Filter out the default NS and SOA records which AWS requires to remain
-    records_to_delete = [record for record in records if
-                         record.get('Type') not in ['NS', 'SOA']]
-
-    # Delete each non-default record
-    for record in records_to_delete:
-        try:
-            print(
-                f"Deleting record {record.get('Name')} ({record.get('Type')})...")
-            client.change_resource_record_sets(
-                    HostedZoneId=zone_id,
-                    ChangeBatch={
-                        "Changes": [{
-                            "Action": "DELETE",
-                            "ResourceRecordSet": record
-                        }]
-                    }
-            )
-        except Exception as e:
-            print(
-                f"Error deleting record {record.get('Name')} ({record.get('Type')}): {e}")
+        return False
+    for change, error in failed:
+        record = change["ResourceRecordSet"]
+        print(
+            f"Error deleting record {record.get('Name')} ({record.get('Type')}): {error}")
 
     # Now, delete the hosted zone itself
     try:
         client.delete_hosted_zone(Id=zone_id)
+        inventory.delete('route53', zone_id)
         print(f"Hosted zone {zone_id} deleted successfully.")
+        return True
     except Exception as e:
         print(f"Error deleting hosted zone {zone_id}: {e}")
+        return False
 
@@ -1,19 +1,46 @@
+import glob
+import hashlib
 import json
+import mmap
 import os
-import boto3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from common.cache import cache_dir
+from common import inventory, ratelimit
+from common.clients import get_client
+from common.output import ContextThreadPoolExecutor
 
-s3_client = boto3.client("s3")
+DEFAULT_CONCURRENCY = 16
+MB = 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD_MB = 8
+DEFAULT_CHUNK_SIZE_MB = 8
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+DELETE_RETRIES = 3
+RETRYABLE_DELETE_ERRORS = {"InternalError", "SlowDown", "ServiceUnavailable", "RequestTimeout"}
+MAX_REPORTED_ERRORS = 20
+# Bytes copied from a GET response body per read
+READ_SIZE = 256 * 1024
+# Listings split the keyspace by delimiter, at most this many levels deep,
+# until there are this many partitions per thread to list in parallel
+FANOUT_DEPTH = 3
+PARTITIONS_PER_THREAD = 4
+SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
 
-def create_s3(bucket_name, access):
+
+def create_s3(bucket_name, access, confirmed=False):
+    s3_client = get_client("s3")
     try:
         # Create the bucket (us-east-1 by default)
         s3_client.create_bucket(Bucket=bucket_name)
         if access == "public":
             # Request confirmation for public buckets
-            confirmation = input("Public access selected. Are you sure? (y/n): ")
+            confirmation = "y" if confirmed else input("Public access selected. Are you sure? (y/n): ")
             if confirmation.lower() != "y":
                 print("Bucket creation aborted.")
-                return
+                return False
             # Disable block public access settings to allow a public bucket policy.
             s3_client.put_public_access_block(
                 Bucket=bucket_name,
@@ -50,86 +77,765 @@ def create_s3(bucket_name, access):
                 ]
             }
         )
+        inventory.put("s3", bucket_name, True, {"access": access})
         print(f"S3 bucket '{bucket_name}' created with {access} access.")
+        return True
     except Exception as e:
         print(f"Error creating S3 bucket: {e}")
+        return False
+
+# Tagging errors that are not worth reporting while listing. Only
+# NoSuchTagSet proves a bucket is not CLI-managed; after AccessDenied or any
+# other error its tags are simply unknown.
+SKIPPED_TAGGING_ERRORS = {"NoSuchTagSet", "AccessDenied"}
+
+def read_managed_access(bucket_name):
+    # Return (access tag, or None if the bucket is not CLI-managed, and
+    # whether its tags could be read at all)
+    s3_client = get_client("s3")
+    try:
+        tag_response = s3_client.get_bucket_tagging(Bucket=bucket_name)
+    except s3_client.exceptions.ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code not in SKIPPED_TAGGING_ERRORS:
+            print(f"Skipping bucket '{bucket_name}': {e}")
+        return None, code == "NoSuchTagSet"
+    tags = {tag["Key"]: tag["Value"] for tag in tag_response.get("TagSet", [])}
+    if tags.get("cli-managed") != "true":
+        return None, True
+    return tags.get("access", "private"), True
+
+def get_managed_access(bucket_name):
+    # Return the bucket's access tag if it is CLI-managed, otherwise None
+    return read_managed_access(bucket_name)[0]
 
-def list_s3():
+def list_s3(concurrency=DEFAULT_CONCURRENCY):
+    cached = inventory.get_listing("s3")
+    if cached is not None:
+        print_buckets((bucket_name, data["access"]) for bucket_name, data in cached)
+        return
+
+    s3_client = get_client("s3")
     try:
         response = s3_client.list_buckets()
     except Exception as e:
         print(f"Error listing buckets: {e}")
-        return
+        return False
 
-    cli_buckets = []
-    for bucket in response.get("Buckets", []):
-        bucket_name = bucket["Name"]
-        try:
-            tag_response = s3_client.get_bucket_tagging(Bucket=bucket_name)
-            tags = {tag["Key"]: tag["Value"] for tag in tag_response.get("TagSet", [])}
-            if tags.get("cli-managed") == "true":
-                access = tags.get("access", "private")
-                cli_buckets.append((bucket_name, access))
-        except s3_client.exceptions.ClientError:
-            # Skip buckets without tagging or if an error occurs.
-            continue
+    # Resolve tags on a bounded pool and print each bucket as soon as its
+    # lookup completes rather than waiting for the whole account.
+    bucket_names = [bucket["Name"] for bucket in response.get("Buckets", [])]
+    managed, unmanaged, unknown = [], [], []
+
+    def resolve():
+        with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {executor.submit(read_managed_access, name): name
+                       for name in bucket_names}
+            for future in as_completed(futures):
+                access, known = future.result()
+                if not known:
+                    unknown.append(futures[future])
+                elif access is None:
+                    unmanaged.append(futures[future])
+                else:
+                    managed.append((futures[future], {"access": access}))
+                    yield futures[future], access
 
-    if not cli_buckets:
+    print_buckets(resolve())
+    # A bucket whose tags could not be read must not be remembered as
+    # unmanaged, and a listing that misses buckets is not complete
+    if not unknown:
+        inventory.put_listing("s3", managed, unmanaged)
+
+def print_buckets(buckets):
+    found = 0
+    for bucket_name, access in buckets:
+        if not found:
+            print("CLI-managed S3 buckets:")
+        found += 1
+        print(f" - Bucket Name: {bucket_name}.\n- Access: {access}.", flush=True)
+
+    if not found:
         print("No CLI-managed S3 buckets found.")
-    else:
-        print("CLI-managed S3 buckets:")
-        for bucket_name, access in cli_buckets:
-            print(f" - Bucket Name: {bucket_name}.\n- Access: {access}.")
 
-def upload_to_s3(bucket_name, file_path):
+def glob_base(pattern):
+    # The leading directories of a glob pattern that hold no wildcards
+    parts = pattern.split(os.sep)
+    for index, part in enumerate(parts):
+        if any(char in part for char in "*?["):
+            return os.sep.join(parts[:index]) or (os.sep if pattern.startswith(os.sep) else os.curdir)
+    return os.curdir
+
+def collect_uploads(file_path=None, directory=None, prefix=""):
+    # Yield (local path, object key) for a file, a glob pattern or a directory.
+    # Glob matches keep their path below the pattern's fixed directories, so
+    # "dist/**/*.js" uploads a/index.js and b/index.js as separate keys.
+    if file_path:
+        if any(char in file_path for char in "*?["):
+            base = glob_base(file_path)
+            for path in sorted(path for path in glob.glob(file_path, recursive=True)
+                               if os.path.isfile(path)):
+                yield path, prefix + os.path.relpath(path, base).replace(os.sep, "/")
+        else:
+            yield file_path, prefix + os.path.basename(file_path)
+    if directory:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                yield path, prefix + relative
+
+def check_cli_managed(bucket_name):
+    # Answer from the local inventory when fresh, otherwise ask S3 and cache
+    # the result
+    cached = inventory.get("s3", bucket_name)
+    if cached is not None:
+        if not cached[0]:
+            print(f"Error: Bucket '{bucket_name}' is not CLI-managed.")
+        return cached[0]
+    s3_client = get_client("s3")
     try:
         tag_response = s3_client.get_bucket_tagging(Bucket=bucket_name)
         tags = {tag["Key"]: tag["Value"] for tag in tag_response.get("TagSet", [])}
         if tags.get("cli-managed") != "true":
+            inventory.put("s3", bucket_name, False)
             print(f"Error: Bucket '{bucket_name}' is not CLI-managed.")
-            return
+            return False
     except s3_client.exceptions.ClientError:
         print(f"Error: Bucket '{bucket_name}' does not have CLI-managed tagging.")
-        return
+        return False
+    inventory.put("s3", bucket_name, True, {"access": tags.get("access", "private")})
+    return True
+
+def upload_to_s3(bucket_name, file_path=None, directory=None, prefix="",
+                 concurrency=DEFAULT_CONCURRENCY,
+                 multipart_threshold_mb=DEFAULT_MULTIPART_THRESHOLD_MB,
+                 chunk_size_mb=DEFAULT_CHUNK_SIZE_MB):
+    s3_client = get_client("s3")
+    if not check_cli_managed(bucket_name):
+        return False
+
+    # The bucket is checked once above; every file then goes through one
+    # transfer manager so all uploads share its thread pool and connections.
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold_mb * MB,
+        multipart_chunksize=chunk_size_mb * MB,
+        max_concurrency=concurrency,
+    )
+    started = time.perf_counter()
+    uploaded, total_bytes = 0, 0
+    with create_transfer_manager(s3_client, transfer_config) as manager:
+        futures = [(path, key, manager.upload(path, bucket_name, key))
+                   for path, key in collect_uploads(file_path, directory, prefix)]
+        for path, key, future in futures:
+            try:
+                future.result()
+                uploaded += 1
+                total_bytes += os.path.getsize(path)
+                print(f"File '{key}' uploaded to '{bucket_name}'.")
+            except Exception as e:
+                print(f"Error uploading file '{path}': {e}")
+
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    if not futures:
+        print("No files matched.")
+        return False
+    if len(futures) > 1:
+        print(f"Uploaded {uploaded}/{len(futures)} files, {total_bytes / MB:.1f} MB in {elapsed:.1f}s "
+              f"({total_bytes / MB / elapsed:.2f} MB/s, {uploaded / elapsed:.1f} objects/s)")
+    return uploaded == len(futures)
+
+def manifest_path(bucket_name, directory, prefix):
+    # One manifest per (bucket, prefix, local directory)
+    source = f"{bucket_name}\0{prefix}\0{os.path.abspath(directory)}"
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir("s3-sync"), f"{bucket_name}-{digest}.json")
 
+def load_manifest(path):
     try:
-        file_name = os.path.basename(file_path)
-        s3_client.upload_file(file_path, bucket_name, file_name)
-        print(f"File '{file_name}' uploaded to '{bucket_name}'.")
-    except Exception as e:
-        print(f"Error uploading file: {e}")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path, manifest):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+def file_identity(stat):
+    return {"inode": stat.st_ino, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+def local_etag(path, size, multipart_threshold, chunk_size):
+    # Compute the content MD5 and the ETag S3 will report for this file:
+    # the plain MD5 for single-part uploads, or the MD5 of the part digests
+    # with a "-<parts>" suffix for multipart uploads. One read of the file.
+    content_md5 = hashlib.md5()
+    part_digests = []
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            content_md5.update(chunk)
+            part_digests.append(hashlib.md5(chunk).digest())
+    if size < multipart_threshold:
+        return content_md5.hexdigest(), f'"{content_md5.hexdigest()}"'
+    multipart_md5 = hashlib.md5(b"".join(part_digests)).hexdigest()
+    return content_md5.hexdigest(), f'"{multipart_md5}-{len(part_digests)}"'
+
+def hash_sync_entry(path, stat, transfer_config):
+    # Manifest entry for a file whose stat changed
+    md5, etag = local_etag(path, stat.st_size, transfer_config.multipart_threshold,
+                           transfer_config.multipart_chunksize)
+    return dict(file_identity(stat), path=path, md5=md5, etag=etag)
+
+def remote_etags(bucket_name, prefix, keys, concurrency):
+    # One listing of the prefix replaces a HeadObject per changed file; only
+    # the ETags of keys are kept
+    etags = {}
+    lock = threading.Lock()
 
-def delete_s3(bucket_name):
+    def collect(objects):
+        with lock:
+            for obj in objects:
+                if obj["Key"] in keys:
+                    etags[obj["Key"]] = obj["ETag"]
+
+    walk_objects(bucket_name, prefix, "/", concurrency, collect)
+    return etags
+
+def sync_to_s3(bucket_name, directory, prefix="",
+               concurrency=DEFAULT_CONCURRENCY,
+               multipart_threshold_mb=DEFAULT_MULTIPART_THRESHOLD_MB,
+               chunk_size_mb=DEFAULT_CHUNK_SIZE_MB):
+    s3_client = get_client("s3")
+    if not check_cli_managed(bucket_name):
+        return False
+
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold_mb * MB,
+        multipart_chunksize=chunk_size_mb * MB,
+        max_concurrency=concurrency,
+    )
+    path = manifest_path(bucket_name, directory, prefix)
+    manifest = load_manifest(path)
+    new_manifest = {}
+    started = time.perf_counter()
+
+    # Files whose inode, size and mtime match the manifest are skipped
+    # without being read or sent to S3.
+    changed = []
+    failed = 0
+    for file_path, key in collect_uploads(None, directory, prefix):
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            # e.g. a symlink whose target is gone
+            failed += 1
+            print(f"Error reading file '{file_path}': {e}")
+            continue
+        previous = manifest.get(key)
+        if previous and all(previous.get(field) == value
+                            for field, value in file_identity(stat).items()):
+            new_manifest[key] = previous
+        else:
+            changed.append((file_path, key, stat, previous))
+    unchanged = len(new_manifest)
+
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        entries = list(executor.map(
+            lambda item: hash_sync_entry(item[0], item[2], transfer_config), changed))
+
+    # A file touched but identical to what we last uploaded is not sent; the
+    # rest are compared with the ETags already in S3
+    unsent = {key for (_, key, _, previous), entry in zip(changed, entries)
+              if not previous or previous.get("etag") != entry["etag"]}
     try:
-        # Check if the bucket is tagged as CLI-managed.
-        tag_response = s3_client.get_bucket_tagging(Bucket=bucket_name)
-        tags = {tag["Key"]: tag["Value"] for tag in tag_response.get("TagSet", [])}
-        if tags.get("cli-managed") != "true":
-            print(f"Error: Bucket '{bucket_name}' is not CLI-managed.")
+        etags = remote_etags(bucket_name, prefix, unsent, concurrency) if unsent else {}
+    except Exception as e:
+        print(f"Error listing objects in '{bucket_name}': {e}")
+        return False
+
+    uploaded, total_bytes = 0, 0
+    with create_transfer_manager(s3_client, transfer_config) as manager:
+        futures = []
+        for (file_path, key, _, _), entry in zip(changed, entries):
+            if key in unsent and etags.get(key) != entry["etag"]:
+                futures.append((key, entry, manager.upload(file_path, bucket_name, key)))
+            else:
+                new_manifest[key] = entry
+        for key, entry, future in futures:
+            try:
+                future.result()
+                new_manifest[key] = entry
+                uploaded += 1
+                total_bytes += entry["size"]
+                print(f"File '{key}' uploaded to '{bucket_name}'.")
+            except Exception as e:
+                failed += 1
+                print(f"Error uploading file '{entry['path']}': {e}")
+
+    save_manifest(path, new_manifest)
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    print(f"Sync complete: {uploaded} uploaded, {len(new_manifest) - uploaded} unchanged "
+          f"({unchanged} skipped without reading), {failed} failed, "
+          f"{total_bytes / MB:.1f} MB in {elapsed:.1f}s")
+    return not failed
+
+def list_objects(bucket_name, prefix=""):
+    # Yield {Key, Size, ETag, ...} for every object under prefix, page by page
+    paginator = get_client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+def list_level(bucket_name, prefix, delimiter, limit, handle_page):
+    # List one level: objects directly under prefix go to handle_page, and the
+    # sub-prefixes are returned for further splitting. A level with more than
+    # limit sub-prefixes keeps only every n-th one (n doubling as needed), so
+    # at most 2 * limit are held; those mark the bounds of key ranges instead.
+    # Returns (sub-prefixes, whether they were thinned out).
+    paginator = get_client("s3").get_paginator("list_objects_v2")
+    prefixes, count, stride = [], 0, 1
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter=delimiter):
+        handle_page(page.get("Contents", []))
+        for common in page.get("CommonPrefixes", []):
+            if count % stride == 0:
+                prefixes.append(common["Prefix"])
+            count += 1
+            if len(prefixes) > 2 * limit:
+                prefixes, stride = prefixes[::2], stride * 2
+    return prefixes, stride > 1
+
+def list_range(bucket_name, prefix, delimiter, start, end, handle_page):
+    # List everything under prefix flat, or with start (a sub-prefix) only the
+    # keys from start up to end (the next bound, or None for the rest of
+    # prefix). Objects directly under prefix were already seen by list_level
+    # and are skipped. StartAfter is exclusive, so a folder marker object
+    # named exactly start is looked up on its own.
+    s3_client = get_client("s3")
+    params = {}
+    if start is not None:
+        marker = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=start, MaxKeys=1)
+        handle_page([obj for obj in marker.get("Contents", []) if obj["Key"] == start])
+        params["StartAfter"] = start
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, **params):
+        contents = page.get("Contents", [])
+        objects = contents if start is None else [
+                obj for obj in contents if delimiter in obj["Key"][len(prefix):]]
+        if end is not None and contents and contents[-1]["Key"] >= end:
+            handle_page([obj for obj in objects if obj["Key"] < end])
             return
-    except s3_client.exceptions.ClientError:
-        print(f"Error: Could not retrieve tags for bucket '{bucket_name}'.")
+        handle_page(objects)
+
+def walk_objects(bucket_name, prefix="", delimiter="/", concurrency=DEFAULT_CONCURRENCY,
+                 handle_page=None):
+    # Call handle_page(objects) for every page of objects under prefix, from
+    # several threads at once. Common prefixes are expanded breadth-first
+    # until there are enough partitions to keep every thread busy; each
+    # partition is then listed flat. A level with more prefixes than its share
+    # of the partitions is split into that many key ranges instead, so the
+    # number of partitions stays bounded however many prefixes the bucket
+    # has. Pages are handed over as they arrive and never held, so memory
+    # does not grow with the bucket.
+    target = max(1, concurrency) * PARTITIONS_PER_THREAD
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        partitions, ranges = [prefix], []
+        for _ in range(FANOUT_DEPTH if delimiter else 0):
+            if len(partitions) + len(ranges) >= target:
+                break
+            limit = max(1, (target - len(ranges)) // len(partitions))
+            levels = list(executor.map(
+                    lambda level: list_level(bucket_name, level, delimiter, limit, handle_page),
+                    partitions))
+            expanded = []
+            for level, (sub_prefixes, thinned) in zip(partitions, levels):
+                if not thinned:
+                    expanded.extend(sub_prefixes)
+                    continue
+                bounds = sub_prefixes + [None]
+                ranges.extend((level, bounds[i], bounds[i + 1]) for i in range(len(sub_prefixes)))
+            partitions = expanded
+            if not partitions:
+                break
+        ranges.extend((partition, None, None) for partition in partitions)
+        list(executor.map(lambda item: list_range(bucket_name, item[0], delimiter, item[1], item[2],
+                                                  handle_page),
+                          ranges))
+
+def format_size(size):
+    for unit in SIZE_UNITS:
+        if size < 1024 or unit == SIZE_UNITS[-1]:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def ls_objects_s3(bucket_name, prefix="", delimiter="/", concurrency=DEFAULT_CONCURRENCY):
+    if not check_cli_managed(bucket_name):
+        return False
+    # Keys are printed page by page as partitions return them, so the output
+    # is sorted within a page but not across prefixes
+    started = time.perf_counter()
+    totals = {"objects": 0, "bytes": 0}
+    print_lock = threading.Lock()
+
+    def print_page(objects):
+        lines = []
+        for obj in objects:
+            modified = obj["LastModified"].strftime("%Y-%m-%d %H:%M:%S") if "LastModified" in obj else ""
+            lines.append(f"{modified:<19}  {obj['Size']:>12}  {obj['Key']}\n")
+        with print_lock:
+            print("".join(lines), end="", flush=True)
+            totals["objects"] += len(objects)
+            totals["bytes"] += sum(obj["Size"] for obj in objects)
+
+    try:
+        walk_objects(bucket_name, prefix, delimiter, concurrency, print_page)
+    except Exception as e:
+        print(f"Error listing objects: {e}")
+        return False
+    if not totals["objects"]:
+        print("No objects found.")
         return
+    print(f"{totals['objects']} objects, {format_size(totals['bytes'])} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+def group_prefix(key, prefix, delimiter, depth):
+    # The prefix key is counted under: prefix plus up to depth more levels
+    parts = key[len(prefix):].split(delimiter)[:-1] if delimiter else []
+    return prefix + "".join(part + delimiter for part in parts[:depth])
+
+def du_s3(bucket_name, prefix="", delimiter="/", depth=1, concurrency=DEFAULT_CONCURRENCY):
+    if not check_cli_managed(bucket_name):
+        return False
+    # Counts and bytes are added up per page, keyed by prefix, so memory
+    # grows with the number of prefixes reported rather than objects
+    started = time.perf_counter()
+    usage = {}
+    lock = threading.Lock()
+
+    def add_page(objects):
+        page_usage = {}
+        for obj in objects:
+            group = group_prefix(obj["Key"], prefix, delimiter, depth)
+            count, size = page_usage.get(group, (0, 0))
+            page_usage[group] = (count + 1, size + obj["Size"])
+        with lock:
+            for group, (count, size) in page_usage.items():
+                total_count, total_size = usage.get(group, (0, 0))
+                usage[group] = (total_count + count, total_size + size)
+
+    try:
+        walk_objects(bucket_name, prefix, delimiter, concurrency, add_page)
+    except Exception as e:
+        print(f"Error listing objects: {e}")
+        return False
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    total_count = sum(count for count, _ in usage.values())
+    total_size = sum(size for _, size in usage.values())
+    if depth > 0:
+        print(f"{'Objects':>12}  {'Size':>10}  Prefix")
+        for group in sorted(usage):
+            count, size = usage[group]
+            print(f"{count:>12}  {format_size(size):>10}  {group or '(bucket root)'}")
+    print(f"Total: {total_count} objects, {format_size(total_size)} under "
+          f"'{bucket_name}/{prefix}' in {elapsed:.1f}s ({total_count / elapsed:.0f} objects/s)")
+
+def download_path(directory, key, prefix):
+    # Local path for key: relative to the prefix's last "/" and never outside
+    # directory. None for folder markers and keys that would escape it.
+    relative = key[prefix.rfind("/") + 1:]
+    if not relative or relative.endswith("/"):
+        return None
+    root = os.path.abspath(directory)
+    path = os.path.normpath(os.path.join(root, *relative.split("/")))
+    return path if path != root and os.path.commonpath([root, path]) == root else None
+
+def new_download(entry, path, multipart_threshold, chunk_size):
+    # Per-object state shared by the GET tasks for one object. Returns the
+    # state and its tasks as (part number, first byte, last byte).
+    size, etag = entry["Size"], entry["ETag"]
+    state = {"key": entry["Key"], "path": path, "temp": f"{path}.part", "size": size,
+             "etag": etag, "digests": {}, "written": 0, "encrypted": False,
+             "error": None, "lock": threading.Lock(), "file": None, "map": None}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if size < multipart_threshold or size == 0:
+        state["remaining"] = 1
+        return state, [(None, None, None)]
+
+    # Large objects are fetched as concurrent GETs written straight into a
+    # preallocated, memory-mapped file. Objects uploaded in parts are fetched
+    # part by part so each part's MD5 can be checked against the ETag.
+    state["file"] = open(state["temp"], "w+b")
+    try:
+        os.posix_fallocate(state["file"].fileno(), 0, size)
+    except (AttributeError, OSError):
+        state["file"].truncate(size)  # sparse file where fallocate is unavailable
+    state["map"] = mmap.mmap(state["file"].fileno(), size)
+    parts = etag.strip('"').partition("-")[2]
+    if parts.isdigit():
+        tasks = [(number, None, None) for number in range(1, int(parts) + 1)]
+    else:
+        tasks = [(None, start, min(start + chunk_size, size) - 1)
+                 for start in range(0, size, chunk_size)]
+    state["remaining"] = len(tasks)
+    return state, tasks
+
+def fetch_part(bucket_name, state, part_number, start, end):
+    # One GET; returns the MD5 digest of the bytes written. IfMatch fails the
+    # request if the object changed since it was listed.
+    s3_client = get_client("s3")
+    params = {"Bucket": bucket_name, "Key": state["key"], "IfMatch": state["etag"]}
+    if part_number:
+        params["PartNumber"] = part_number
+    elif start is not None:
+        params["Range"] = f"bytes={start}-{end}"
+    response = s3_client.get_object(**params)
+    if response.get("ServerSideEncryption") == "aws:kms" or response.get("SSECustomerAlgorithm"):
+        state["encrypted"] = True  # the ETag is not an MD5 of the content
+    md5 = hashlib.md5()
+    written = 0
+    if state["map"] is None:
+        with open(state["temp"], "wb") as f:
+            for chunk in response["Body"].iter_chunks(READ_SIZE):
+                f.write(chunk)
+                md5.update(chunk)
+                written += len(chunk)
+    else:
+        if part_number:
+            start = int(response["ContentRange"].split()[1].split("-")[0])
+        offset = start
+        for chunk in response["Body"].iter_chunks(READ_SIZE):
+            state["map"][offset:offset + len(chunk)] = chunk
+            md5.update(chunk)
+            offset += len(chunk)
+        written = offset - start
+    with state["lock"]:
+        state["written"] += written
+    return md5.digest()
+
+def verify_download(state):
+    # True if the content matches the ETag, None if the ETag is not an MD5
+    etag = state["etag"].strip('"')
+    digest, _, parts = etag.partition("-")
+    if state["encrypted"] or len(digest) != 32:
+        return None
+    if parts:
+        if None in state["digests"]:
+            return None  # a multipart object small enough to fetch in one GET
+        combined = b"".join(state["digests"][number] for number in sorted(state["digests"]))
+        return hashlib.md5(combined).hexdigest() == digest
+    if state["map"] is not None:
+        return hashlib.md5(state["map"]).hexdigest() == digest
+    return state["digests"][None].hex() == digest
+
+def finish_download(state):
+    # Runs once, after the object's last GET; moves the file into place
+    verified = None
+    try:
+        if state["error"] is None:
+            if state["written"] != state["size"]:
+                state["error"] = f"expected {state['size']} bytes, got {state['written']}"
+            else:
+                verified = verify_download(state)
+                if verified is False:
+                    state["error"] = f"content does not match ETag {state['etag']}"
+    finally:
+        if state["map"] is not None:
+            state["map"].close()
+            state["file"].close()
+    if state["error"] is not None:
+        if os.path.exists(state["temp"]):
+            os.remove(state["temp"])
+    else:
+        os.replace(state["temp"], state["path"])
+    return {"key": state["key"], "path": state["path"], "size": state["size"],
+            "verified": verified, "error": state["error"]}
+
+def run_download_task(bucket_name, state, part_number, start, end):
+    # Returns the object's result if this was its last GET, otherwise None
+    try:
+        digest = fetch_part(bucket_name, state, part_number, start, end)
+    except Exception as e:
+        digest = None
+        with state["lock"]:
+            state["error"] = state["error"] or str(e)
+    with state["lock"]:
+        if digest is not None:
+            state["digests"][part_number] = digest
+        state["remaining"] -= 1
+        if state["remaining"]:
+            return None
+    return finish_download(state)
+
+def download_s3(bucket_name, key=None, prefix="", directory=".",
+                concurrency=DEFAULT_CONCURRENCY,
+                multipart_threshold_mb=DEFAULT_MULTIPART_THRESHOLD_MB,
+                chunk_size_mb=DEFAULT_CHUNK_SIZE_MB):
+    s3_client = get_client("s3")
+    if not check_cli_managed(bucket_name):
+        return False
+    if key:
+        try:
+            head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        except s3_client.exceptions.ClientError as e:
+            print(f"Error: Object '{key}' not found in '{bucket_name}': {e}")
+            return False
+        entries = [{"Key": key, "Size": head["ContentLength"], "ETag": head["ETag"]}]
+        prefix = key
+    else:
+        entries = list_objects(bucket_name, prefix)
+
+    # Small objects and the ranges of large ones share one worker pool; at
+    # most 2x concurrency GETs are queued so listing a huge bucket does not
+    # build up work (or open files) in memory.
+    started = time.perf_counter()
+    results = {"downloaded": 0, "failed": 0, "bytes": 0, "verified": 0, "unverified": 0,
+               "interrupted": False}
+    in_flight = set()
+
+    def collect(done):
+        for future in done:
+            result = future.result()
+            if result is None:
+                continue
+            if result["error"]:
+                results["failed"] += 1
+                print(f"Error downloading '{result['key']}': {result['error']}")
+                continue
+            results["downloaded"] += 1
+            results["bytes"] += result["size"]
+            results["verified" if result["verified"] else "unverified"] += 1
+            print(f"File '{result['key']}' downloaded to '{result['path']}'.")
+
+    try:
+        with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for entry in entries:
+                path = download_path(directory, entry["Key"], prefix)
+                if path is None:
+                    continue
+                state, tasks = new_download(entry, path, multipart_threshold_mb * MB, chunk_size_mb * MB)
+                for task in tasks:
+                    if len(in_flight) >= 2 * max(1, concurrency):
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(run_download_task, bucket_name, state, *task))
+            collect(wait(in_flight).done)
+    except Exception as e:
+        print(f"Error downloading from '{bucket_name}': {e}")
+        results["interrupted"] = True
+
+    total = results["downloaded"] + results["failed"]
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    if not total:
+        print("No objects matched.")
+        return False
+    print(f"Downloaded {results['downloaded']}/{total} objects, {results['bytes'] / MB:.1f} MB in {elapsed:.1f}s "
+          f"({results['bytes'] / MB / elapsed:.2f} MB/s, {results['downloaded'] / elapsed:.1f} objects/s); "
+          f"{results['verified']} verified against their ETag, {results['unverified']} without an MD5 ETag")
+    return not (results["failed"] or results["interrupted"])
+
+def object_version_batches(bucket_name):
+    # Yield batches of up to 1000 {Key, VersionId} covering every object
+    # version and delete marker. Unversioned objects have VersionId "null".
+    s3_client = get_client("s3")
+    paginator = s3_client.get_paginator("list_object_versions")
+    batch = []
+    for page in paginator.paginate(Bucket=bucket_name):
+        for entry in page.get("Versions", []) + page.get("DeleteMarkers", []):
+            batch.append({"Key": entry["Key"], "VersionId": entry["VersionId"]})
+            if len(batch) == DELETE_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def delete_batch(bucket_name, objects):
+    # Delete one batch, retrying keys that failed with a transient error.
+    # Returns (number deleted, per-key errors that could not be resolved).
+    s3_client = get_client("s3")
+    deleted, errors = 0, []
+    pending = objects
+    for attempt in range(DELETE_RETRIES + 1):
+        if attempt:
+            time.sleep(2 ** attempt * 0.1)
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket_name, Delete={"Objects": pending, "Quiet": True})
+        except s3_client.exceptions.ClientError as e:
+            failed = [dict(obj, Code=e.response["Error"]["Code"],
+                           Message=e.response["Error"].get("Message", ""))
+                      for obj in pending]
+        else:
+            failed = response.get("Errors", [])
+            # Per-key SlowDown errors arrive in a 200 response, out of sight
+            # of the retry handler, so report them to the rate limiter here
+            if any(error.get("Code") == "SlowDown" for error in failed):
+                ratelimit.record_throttle("s3", "DeleteObjects")
+        deleted += len(pending) - len(failed)
+        errors.extend(error for error in failed
+                      if error.get("Code") not in RETRYABLE_DELETE_ERRORS)
+        pending = [{"Key": error["Key"], "VersionId": error.get("VersionId")}
+                   for error in failed if error.get("Code") in RETRYABLE_DELETE_ERRORS]
+        if not pending:
+            return deleted, errors
+    errors.extend(dict(obj, Code="RetriesExhausted") for obj in pending)
+    return deleted, errors
+
+def empty_bucket(bucket_name, concurrency=DEFAULT_CONCURRENCY):
+    # Listing and deletion overlap; at most 2x concurrency batches are in
+    # flight so memory stays bounded however large the bucket is.
+    deleted, errors = 0, []
+    in_flight = set()
+
+    def collect(done):
+        nonlocal deleted
+        for future in done:
+            batch_deleted, batch_errors = future.result()
+            deleted += batch_deleted
+            errors.extend(batch_errors)
+
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for batch in object_version_batches(bucket_name):
+            if len(in_flight) >= 2 * max(1, concurrency):
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(delete_batch, bucket_name, batch))
+        collect(wait(in_flight).done)
+    return deleted, errors
+
+def delete_s3(bucket_name, concurrency=DEFAULT_CONCURRENCY):
+    s3_client = get_client("s3")
+    # Check if the bucket is tagged as CLI-managed.
+    if not check_cli_managed(bucket_name):
+        return False
 
     confirmation = input(
         f"Are you sure you want to delete bucket '{bucket_name}' and all its contents? (y/n): ")
     if confirmation.lower() != 'y':
         print("Bucket deletion aborted.")
-        return
-    # Empty the bucket by deleting all objects inside.
+        return False
+    # Empty the bucket: one thread pages through every object version and
+    # delete marker while a worker pool deletes 1000-key batches in parallel.
     try:
-        paginator = s3_client.get_paginator('list_objects_v2')
-        for page in paginator.paginate(Bucket=bucket_name):
-            if 'Contents' in page:
-                delete_keys = {'Objects': [{'Key': obj['Key']} for obj in page['Contents']]}
-                s3_client.delete_objects(Bucket=bucket_name, Delete=delete_keys)
-        print(f"Bucket '{bucket_name}' has been emptied.")
+        deleted, errors = empty_bucket(bucket_name, concurrency)
     except Exception as e:
         print(f"Error emptying bucket: {e}")
-        return
+        return False
+    for error in errors[:MAX_REPORTED_ERRORS]:
+        print(f"Error deleting '{error['Key']}' (version {error.get('VersionId')}): "
+              f"{error.get('Code')} {error.get('Message', '')}")
+    if errors:
+        print(f"Error emptying bucket: {len(errors)} object(s) could not be deleted.")
+        return False
+    print(f"Bucket '{bucket_name}' has been emptied ({deleted} object versions deleted).")
     # Now delete the bucket.
     try:
         s3_client.delete_bucket(Bucket=bucket_name)
+        inventory.delete("s3", bucket_name)
         print(f"S3 bucket '{bucket_name}' has been deleted.")
+        return True
     except Exception as e:
         print(f"Error deleting S3 bucket: {e}")
+        return False
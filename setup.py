@@ -5,6 +5,7 @@ setup(
     version="1.0",
     py_modules=["deploy"],
     install_requires=["boto3"],
+    extras_require={"yaml": ["PyYAML"]},
     entry_points={
         "console_scripts": ["awscli=deploy:main"]
     },
@@ -0,0 +1,117 @@
+import json
+import os
+import re
+
+# A stack manifest lists the instances, buckets, zones and records that
+# should exist. Record values may reference attributes of other resources,
+# e.g. ${instance.web.public_ip} or ${zone.example.com.id}; the record then
+# waits for that resource during apply.
+KINDS = ["instances", "buckets", "zones", "records"]
+INSTANCE_TYPES = ["t3.nano", "t4g.nano"]
+AMIS = ["ubuntu", "amazon-linux"]
+ACCESS_TYPES = ["private", "public"]
+DEFAULT_TTL = 300
+REFERENCE = re.compile(r"\$\{(instance|zone)\.([^}]+)\.(\w+)\}")
+ATTRIBUTES = {"instance": ["id", "public_ip"], "zone": ["id"]}
+
+def load_manifest(file_path):
+    # JSON always works; YAML needs PyYAML, installed with the yaml extra
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if os.path.splitext(file_path)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            print("Error: YAML manifests need PyYAML (pip install pyyaml); use JSON instead.")
+            return None
+        return yaml.safe_load(text) or {}
+    return json.loads(text)
+
+def zone_key(name):
+    # Zone and record names compare lower-case with a trailing dot
+    return name.rstrip(".").lower() + "."
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+def normalize(manifest):
+    # Fill in defaults and check every entry. Returns (stack, errors).
+    errors = []
+    stack = {kind: [] for kind in KINDS}
+    unknown = set(manifest) - set(KINDS)
+    if unknown:
+        errors.append(f"unknown section(s): {', '.join(sorted(unknown))}")
+    for entry in manifest.get("instances") or []:
+        instance = {"name": entry.get("name"), "type": entry.get("type"),
+                    "ami": entry.get("ami"), "pubkey": entry.get("pubkey"),
+                    "count": int(entry.get("count", 1))}
+        if not instance["name"]:
+            errors.append("instance without a name")
+            continue
+        if instance["type"] not in INSTANCE_TYPES:
+            errors.append(f"instance {instance['name']}: type must be one of {', '.join(INSTANCE_TYPES)}")
+        if instance["ami"] not in AMIS:
+            errors.append(f"instance {instance['name']}: ami must be one of {', '.join(AMIS)}")
+        if not instance["pubkey"]:
+            errors.append(f"instance {instance['name']}: pubkey is required")
+        else:
+            instance["pubkey"] = os.path.expanduser(instance["pubkey"])
+        stack["instances"].append(instance)
+    for entry in manifest.get("buckets") or []:
+        bucket = {"name": entry.get("name"), "access": entry.get("access", "private")}
+        if not bucket["name"]:
+            errors.append("bucket without a name")
+            continue
+        if bucket["access"] not in ACCESS_TYPES:
+            errors.append(f"bucket {bucket['name']}: access must be private or public")
+        stack["buckets"].append(bucket)
+    for entry in manifest.get("zones") or []:
+        if not entry.get("name"):
+            errors.append("zone without a name")
+            continue
+        stack["zones"].append({"name": zone_key(entry["name"])})
+    for entry in manifest.get("records") or []:
+        if not (entry.get("zone") and entry.get("name") and entry.get("type")
+                and entry.get("value") is not None):
+            errors.append(f"record {entry.get('name')}: zone, name, type and value are required")
+            continue
+        zone = zone_key(entry["zone"])
+        name = entry["name"]
+        # Relative names such as "www" or "@" are taken from the zone
+        if name == "@":
+            name = zone
+        elif not name.endswith("."):
+            in_zone = zone_key(name) == zone or zone_key(name).endswith("." + zone)
+            name = name if in_zone else f"{name}.{zone}"
+        record = {"zone": zone, "name": zone_key(name), "type": entry["type"].upper(),
+                  "ttl": int(entry.get("ttl", DEFAULT_TTL)),
+                  "values": [str(value) for value in as_list(entry["value"])]}
+        for value in record["values"]:
+            for kind, _, attribute in references(value):
+                if attribute not in ATTRIBUTES[kind]:
+                    errors.append(f"record {record['name']}: {kind} has no attribute {attribute}")
+        stack["records"].append(record)
+    return stack, errors
+
+def references(value):
+    # [(kind, name, attribute)] for every ${kind.name.attribute} in value
+    return [(kind, zone_key(name) if kind == "zone" else name, attribute)
+            for kind, name, attribute in REFERENCE.findall(value)]
+
+def resolve(value, outputs):
+    # Substitute references from outputs[(kind, name)][attribute]. Returns
+    # None if any referenced attribute is not known yet.
+    missing = []
+
+    def substitute(match):
+        kind, name, attribute = match.groups()
+        if kind == "zone":
+            name = zone_key(name)
+        known = outputs.get((kind, name), {}).get(attribute)
+        if known is None:
+            missing.append(match.group(0))
+            return ""
+        return str(known)
+
+    resolved = REFERENCE.sub(substitute, value)
+    return None if missing else resolved
@@ -0,0 +1,346 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from common.clients import get_client
+from common.output import ContextThreadPoolExecutor
+from ec2.ec2_instance import (FILTER_VALUES_LIMIT, LIVE_STATES, MAX_RUNNING_INSTANCES,
+                              count_running_instances, create_ec2, get_or_create_key_pair_boto,
+                              instance_names_for, instance_rows)
+from route53.route53_changes import submit_changes, wait_for_changes
+from route53.route53_records import iter_record_sets
+from route53.route53_zones import create_route53_zone, zone_id_of
+from s3.s3_bucket import create_s3, get_managed_access
+from stack.stack_manifest import load_manifest, normalize, references, resolve, zone_key
+
+DEFAULT_CONCURRENCY = 8
+SYMBOLS = {"create": "+", "update": "~", "noop": "="}
+
+# --------------------------
+# Current state
+# --------------------------
+def fetch_instances(names):
+    # One filtered DescribeInstances per FILTER_VALUES_LIMIT names
+    found = {}
+    for start in range(0, len(names), FILTER_VALUES_LIMIT):
+        filters = [{"Name": "tag:cli-managed", "Values": ["true"]},
+                   {"Name": "instance-state-name", "Values": LIVE_STATES},
+                   {"Name": "tag:Name", "Values": names[start:start + FILTER_VALUES_LIMIT]}]
+        for instance_id, name, state, public_ip, instance_type in instance_rows(filters):
+            found[name] = {"id": instance_id, "state": state, "type": instance_type,
+                           "public_ip": None if public_ip == "-" else public_ip}
+    return found
+
+def fetch_buckets(names, executor):
+    # One ListBuckets call, then tag lookups only for buckets in the stack
+    response = get_client("s3").list_buckets()
+    existing = [bucket["Name"] for bucket in response.get("Buckets", [])
+                if bucket["Name"] in names]
+    return dict(zip(existing, executor.map(get_managed_access, existing)))
+
+def fetch_zones(names):
+    found = {}
+    paginator = get_client("route53").get_paginator("list_hosted_zones")
+    for page in paginator.paginate():
+        for zone in page["HostedZones"]:
+            name = zone_key(zone["Name"])
+            if name in names and name not in found:
+                found[name] = zone_id_of(zone)
+    return found
+
+def fetch_records(zone_id, wanted):
+    # One paginated listing per zone, keeping only the record sets in the stack
+    found = {}
+    for record_set in iter_record_sets(zone_id):
+        key = (zone_key(record_set["Name"]), record_set["Type"])
+        if key in wanted:
+            found[key] = {"ttl": record_set.get("TTL"),
+                          "values": sorted(r["Value"] for r in record_set.get("ResourceRecords", []))}
+    return found
+
+def fetch_state(stack, concurrency):
+    # Independent listings run side by side; record listings follow once
+    # zone IDs are known
+    instance_names = {name for instance in stack["instances"]
+                      for name in instance_names_for(instance["name"], instance["count"])}
+    zone_names = {zone["name"] for zone in stack["zones"]}
+    for record in stack["records"]:
+        zone_names.add(record["zone"])
+        for value in record["values"]:
+            for kind, name, _ in references(value):
+                (instance_names if kind == "instance" else zone_names).add(name)
+    bucket_names = {bucket["name"] for bucket in stack["buckets"]}
+
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        instances = executor.submit(fetch_instances, sorted(instance_names)) if instance_names else None
+        zones = executor.submit(fetch_zones, zone_names) if zone_names else None
+        buckets = fetch_buckets(bucket_names, executor) if bucket_names else {}
+        state = {"instance": instances.result() if instances else {},
+                 "bucket": buckets,
+                 "zone": zones.result() if zones else {},
+                 "record": {}}
+        wanted = {}
+        for record in stack["records"]:
+            if record["zone"] in state["zone"]:
+                wanted.setdefault(record["zone"], set()).add((record["name"], record["type"]))
+        listings = {zone: executor.submit(fetch_records, state["zone"][zone], keys)
+                    for zone, keys in wanted.items()}
+        for future in listings.values():
+            state["record"].update(future.result())
+    return state
+
+# --------------------------
+# Diff
+# --------------------------
+def plan_changes(stack, state):
+    # Returns (changes, outputs, errors). Each change is a node of the apply
+    # graph with the keys of the nodes it waits for; outputs holds the
+    # attributes of resources that already exist.
+    outputs = {("instance", name): {"id": data["id"], "public_ip": data["public_ip"]}
+               for name, data in state["instance"].items()}
+    outputs.update({("zone", name): {"id": zone_id} for name, zone_id in state["zone"].items()})
+    changes, errors = [], []
+    creates = {}  # (kind, name) of a resource still to be created -> node key
+
+    for instance in stack["instances"]:
+        names = instance_names_for(instance["name"], instance["count"])
+        missing = [name for name in names if name not in state["instance"]]
+        key = ("instance", instance["name"])
+        detail = f"{instance['type']}, {instance['ami']}"
+        if instance["count"] > 1:
+            detail += f", {len(missing)} of {len(names)} to launch" if missing else f", {len(names)}"
+        changes.append({"key": key, "action": "create" if missing else "noop", "detail": detail,
+                        "deps": set(), "entry": instance, "missing": missing})
+        for name in missing:
+            creates[("instance", name)] = key
+
+    for bucket in stack["buckets"]:
+        key = ("bucket", bucket["name"])
+        if bucket["name"] not in state["bucket"]:
+            changes.append({"key": key, "action": "create", "detail": f"{bucket['access']}",
+                            "deps": set(), "entry": bucket})
+            continue
+        access = state["bucket"][bucket["name"]]
+        if access is None:
+            detail = "exists, not CLI-managed"
+        elif access != bucket["access"]:
+            detail = f"{access}; access changes are not applied, manifest says {bucket['access']}"
+        else:
+            detail = access
+        changes.append({"key": key, "action": "noop", "detail": detail, "deps": set(), "entry": bucket})
+
+    for zone in stack["zones"]:
+        key = ("zone", zone["name"])
+        exists = zone["name"] in state["zone"]
+        changes.append({"key": key, "action": "noop" if exists else "create",
+                        "detail": state["zone"].get(zone["name"], ""), "deps": set(), "entry": zone})
+        if not exists:
+            creates[key] = key
+
+    for record in stack["records"]:
+        key = ("record", f"{record['name']} {record['type']}")
+        deps = set()
+        if ("zone", record["zone"]) in creates:
+            deps.add(creates[("zone", record["zone"])])
+        elif record["zone"] not in state["zone"]:
+            errors.append(f"record {record['name']}: zone {record['zone']} not found")
+            continue
+        for value in record["values"]:
+            for kind, name, _ in references(value):
+                if (kind, name) in creates:
+                    deps.add(creates[(kind, name)])
+                elif (kind, name) not in outputs:
+                    errors.append(f"record {record['name']}: {kind} {name} not found")
+        values = [resolve(value, outputs) for value in record["values"]]
+        current = state["record"].get((record["name"], record["type"]))
+        if None in values:
+            action = "update" if current else "create"
+            detail = f"{', '.join(record['values'])} (known after apply)"
+        elif current is None:
+            action, detail = "create", ", ".join(values)
+        elif current["values"] != sorted(values) or current["ttl"] != record["ttl"]:
+            action = "update"
+            detail = f"{', '.join(current['values'])} -> {', '.join(values)}"
+            if current["ttl"] != record["ttl"]:
+                detail += f", TTL {current['ttl']} -> {record['ttl']}"
+        else:
+            action, detail = "noop", ", ".join(values)
+        changes.append({"key": key, "action": action, "detail": detail,
+                        "deps": deps, "entry": record})
+    return changes, outputs, errors
+
+def print_plan(changes):
+    for change in changes:
+        kind, name = change["key"]
+        detail = f" ({change['detail']})" if change["detail"] else ""
+        print(f"  {SYMBOLS[change['action']]} {kind} {name}{detail}")
+    counts = {action: sum(1 for c in changes if c["action"] == action) for action in SYMBOLS}
+    print(f"Plan: {counts['create']} to create, {counts['update']} to update, "
+          f"{counts['noop']} unchanged.")
+
+def prepare(file_path, concurrency):
+    try:
+        manifest = load_manifest(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest {file_path}: {e}")
+        return None
+    if manifest is None:
+        return None
+    stack, errors = normalize(manifest)
+    if not errors:
+        print(f"Reading current state for {file_path}...")
+        state = fetch_state(stack, concurrency)
+        changes, outputs, errors = plan_changes(stack, state)
+    if errors:
+        print(f"Invalid manifest {file_path}:")
+        for error in errors:
+            print(f" - {error}")
+        return None
+    print_plan(changes)
+    return changes, outputs
+
+def plan_stack(file_path, concurrency=DEFAULT_CONCURRENCY):
+    return prepare(file_path, concurrency) is not None
+
+# --------------------------
+# Apply
+# --------------------------
+def run_graph(nodes, concurrency):
+    # Run each node once all of its dependencies have succeeded, with
+    # independent branches in parallel. A failed node skips its dependents.
+    # nodes: {key: (label, dependency keys, function returning True on success)}
+    remaining = dict(nodes)
+    done, failed, skipped = set(), set(), set()
+    running = {}
+    with ContextThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        while remaining or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for key, (label, deps, run) in list(remaining.items()):
+                    if deps & (failed | skipped):
+                        print(f"Skipping {label}: a dependency failed")
+                        skipped.add(key)
+                    elif deps <= done:
+                        running[executor.submit(run)] = (key, label, time.monotonic())
+                    else:
+                        continue
+                    del remaining[key]
+                    progressed = True
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key, label, started = running.pop(future)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"Error applying {label}: {e}")
+                    ok = False
+                (done if ok else failed).add(key)
+                status = "done" if ok else "FAILED"
+                print(f"[{status}] {label} ({time.monotonic() - started:.1f}s)", flush=True)
+    return done, failed, skipped
+
+def apply_stack(file_path, concurrency=DEFAULT_CONCURRENCY, wait_insync=False, assume_yes=False):
+    started = time.monotonic()
+    prepared = prepare(file_path, concurrency)
+    if prepared is None:
+        return False
+    changes, outputs = prepared
+    pending = [change for change in changes if change["action"] != "noop"]
+    if not pending:
+        print("Nothing to apply.")
+        return
+    # create_ec2 checks the running-instance quota per call, and parallel
+    # nodes would all pass that check before any of them launched, so the
+    # stack's launches are checked together here and run one at a time below
+    launching = sum(len(change["missing"]) for change in pending if change["key"][0] == "instance")
+    if launching:
+        running = count_running_instances()
+        if running + launching > MAX_RUNNING_INSTANCES:
+            print(f"Error: Maximum running instances is {MAX_RUNNING_INSTANCES}; "
+                  f"cannot launch {launching} more while {running} are running or pending.")
+            return False
+    if not assume_yes:
+        confirmation = input(f"Apply {len(pending)} change(s)? (y/n): ")
+        if confirmation.lower() != "y":
+            print("Apply aborted.")
+            return False
+
+    change_ids = []
+    launch_lock = threading.Lock()
+
+    def launch(instance, missing):
+        with launch_lock:
+            return launch_group(instance, missing)
+
+    def launch_group(instance, missing):
+        # The whole group goes out in one RunInstances call when none exist yet
+        if len(missing) == instance["count"]:
+            created = create_ec2(instance["name"], instance["type"], instance["ami"],
+                                 instance["pubkey"], instance["count"])
+            created = ([created] if created else []) if instance["count"] == 1 else created or []
+        else:
+            created = [result for result in
+                       (create_ec2(name, instance["type"], instance["ami"], instance["pubkey"])
+                        for name in missing) if result]
+        for instance_id, name, public_ip in created:
+            outputs[("instance", name)] = {"id": instance_id, "public_ip": public_ip}
+        return len(created) == len(missing)
+
+    def create_zone(zone):
+        zone_id = create_route53_zone(zone["name"])
+        outputs[("zone", zone["name"])] = {"id": zone_id}
+        return zone_id is not None
+
+    def upsert_records(zone_name, records):
+        # Records of one zone that become ready together share a ChangeBatch
+        batch = []
+        for record in records:
+            values = [resolve(value, outputs) for value in record["values"]]
+            if None in values:
+                print(f"Error: {record['name']} references an attribute that is not available")
+                return False
+            batch.append({"Action": "UPSERT", "ResourceRecordSet": {
+                "Name": record["name"], "Type": record["type"], "TTL": record["ttl"],
+                "ResourceRecords": [{"Value": value} for value in values]}})
+        submitted, failed = submit_changes(outputs[("zone", zone_name)]["id"], batch)
+        for change, error in failed:
+            print(f"Error applying {change['ResourceRecordSet']['Name']}: {error}")
+        change_ids.extend(submitted)
+        return not failed
+
+    nodes = {}
+    record_groups = {}
+    for change in pending:
+        kind, name = change["key"]
+        entry = change["entry"]
+        if kind == "instance":
+            run = lambda entry=entry, missing=change["missing"]: launch(entry, missing)
+        elif kind == "bucket":
+            run = lambda entry=entry: create_s3(entry["name"], entry["access"], confirmed=True)
+        elif kind == "zone":
+            run = lambda entry=entry: create_zone(entry)
+        else:
+            record_groups.setdefault((entry["zone"], frozenset(change["deps"])), []).append(entry)
+            continue
+        nodes[change["key"]] = (f"{kind} {name}", set(change["deps"]), run)
+    for (zone_name, deps), records in record_groups.items():
+        label = f"{len(records)} record(s) in {zone_name}"
+        nodes[("records", label)] = (label, set(deps),
+                                     lambda z=zone_name, r=records: upsert_records(z, r))
+
+    # Import each key pair once up front instead of racing from parallel launches
+    for pubkey in sorted({c["entry"]["pubkey"] for c in pending if c["key"][0] == "instance"}):
+        try:
+            get_or_create_key_pair_boto(pubkey)
+        except (OSError, get_client("ec2").exceptions.ClientError) as e:
+            print(f"Error preparing key pair {pubkey}: {e}")
+
+    done, failed, skipped = run_graph(nodes, concurrency)
+    insync = True
+    if wait_insync and change_ids:
+        insync = len(wait_for_changes(change_ids)) == len(set(change_ids))
+    print(f"Apply finished in {time.monotonic() - started:.1f}s: {len(done)} succeeded, "
+          f"{len(failed)} failed, {len(skipped)} skipped.")
+    return insync and not (failed or skipped)
@@ -0,0 +1,166 @@
+import io
+import json
+import unittest
+from route53.route53_zonefile import (detect_format, parse_bind, parse_csv,
+                                      parse_ttl, read_record_sets, write_record_set)
+
+ORIGIN = "example.com."
+
+def bind(text, origin=ORIGIN):
+    return list(parse_bind(io.StringIO(text), origin))
+
+def record_sets(text, file_format, origin=ORIGIN):
+    return list(read_record_sets(io.StringIO(text), file_format, origin))
+
+class DetectFormatTest(unittest.TestCase):
+    def test_extensions(self):
+        self.assertEqual(detect_format("zone.json"), "json")
+        self.assertEqual(detect_format("zone.JSONL"), "json")
+        self.assertEqual(detect_format("zone.csv"), "csv")
+        self.assertEqual(detect_format("db.example.com"), "bind")
+
+class ParseBindTest(unittest.TestCase):
+    def test_names_resolve_against_origin(self):
+        records = bind("@ IN A 192.0.2.1\n"
+                       "www IN A 192.0.2.2\n"
+                       "mail.example.org. IN A 192.0.2.3\n")
+        self.assertEqual([name for name, _, _, _ in records],
+                         ["example.com.", "www.example.com.", "mail.example.org."])
+
+    def test_blank_owner_repeats_previous_name(self):
+        records = bind("www IN A 192.0.2.1\n"
+                       "    IN A 192.0.2.2\n")
+        self.assertEqual([name for name, _, _, _ in records], ["www.example.com."] * 2)
+
+    def test_ttl_and_class_in_either_order(self):
+        records = bind("a 60 IN A 192.0.2.1\n"
+                       "b IN 120 A 192.0.2.2\n"
+                       "c A 192.0.2.3\n")
+        self.assertEqual([ttl for _, _, ttl, _ in records], [60, 120, 300])
+
+    def test_ttl_directive_and_units(self):
+        records = bind("$TTL 1h\n"
+                       "a IN A 192.0.2.1\n"
+                       "b 1h30m IN A 192.0.2.2\n"
+                       "$TTL 2D\n"
+                       "c IN A 192.0.2.3\n")
+        self.assertEqual([ttl for _, _, ttl, _ in records], [3600, 5400, 172800])
+
+    def test_parse_ttl(self):
+        self.assertEqual(parse_ttl("300"), 300)
+        self.assertEqual(parse_ttl("1w"), 604800)
+        self.assertEqual(parse_ttl("1h1m1s"), 3661)
+
+    def test_origin_directive(self):
+        records = bind("$ORIGIN sub\n"
+                       "www IN A 192.0.2.1\n")
+        self.assertEqual(records[0][0], "www.sub.example.com.")
+
+    def test_targets_are_qualified(self):
+        records = bind("www IN CNAME web\n"
+                       "@ IN MX 10 mail\n"
+                       "_sip._tcp IN SRV 10 5 5060 sip.example.org.\n"
+                       "@ IN NS ns1\n")
+        self.assertEqual([value for _, _, _, value in records],
+                         ["web.example.com.", "10 mail.example.com.",
+                          "10 5 5060 sip.example.org.", "ns1.example.com."])
+
+    def test_txt_keeps_spacing_and_semicolons(self):
+        records = bind('@ IN TXT "v=spf1  include:x ; ~all" ; comment\n')
+        self.assertEqual(records[0][3], '"v=spf1  include:x ; ~all"')
+
+    def test_parentheses_join_lines(self):
+        records = bind("@ IN SOA ns1 admin (\n"
+                       "    1 ; serial\n"
+                       "    7200 3600 1209600 300 )\n"
+                       "www IN A 192.0.2.1\n")
+        self.assertEqual([record_type for _, record_type, _, _ in records], ["SOA", "A"])
+        self.assertEqual(records[0][3].split(), ["ns1", "admin", "1", "7200", "3600", "1209600", "300"])
+
+    def test_short_record_reports_line(self):
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            bind("www IN A 192.0.2.1\n"
+                 "bad IN\n")
+
+    def test_missing_target_field_reports_line(self):
+        with self.assertRaisesRegex(ValueError, "line 1: MX"):
+            bind("@ IN MX 10\n")
+
+    def test_include_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, r"line 1: \$INCLUDE is not supported"):
+            bind("$INCLUDE other.zone\n")
+
+    def test_invalid_ttl_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "invalid \\$TTL"):
+            bind("$TTL soon\n")
+
+    def test_unbalanced_parentheses(self):
+        with self.assertRaisesRegex(ValueError, "never closed"):
+            bind("@ IN SOA ns1 admin ( 1 7200\n")
+        with self.assertRaisesRegex(ValueError, "unbalanced"):
+            bind("@ IN A 192.0.2.1 )\n")
+
+class ParseCsvTest(unittest.TestCase):
+    def test_rows(self):
+        rows = list(parse_csv(io.StringIO("name,type,ttl,value\n"
+                                          "www,a,,192.0.2.1\n"
+                                          "@,TXT,60,\"a, b\"\n"), ORIGIN))
+        self.assertEqual(rows, [("www.example.com.", "A", 300, "192.0.2.1"),
+                                ("example.com.", "TXT", 60, "a, b")])
+
+    def test_short_row_reports_line(self):
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            list(parse_csv(io.StringIO("www,A,300,192.0.2.1\nbad,A\n"), ORIGIN))
+
+    def test_invalid_ttl(self):
+        with self.assertRaisesRegex(ValueError, "invalid TTL"):
+            list(parse_csv(io.StringIO("www,A,soon,192.0.2.1\n"), ORIGIN))
+
+class ReadRecordSetsTest(unittest.TestCase):
+    def test_values_are_grouped_by_name_and_type(self):
+        sets = record_sets("www IN A 192.0.2.1\n"
+                           "www IN A 192.0.2.2\n"
+                           "www IN AAAA 2001:db8::1\n"
+                           "mail IN A 192.0.2.3\n", "bind")
+        self.assertEqual([(s["Name"], s["Type"], len(s["ResourceRecords"])) for s in sets],
+                         [("www.example.com.", "A", 2), ("www.example.com.", "AAAA", 1),
+                          ("mail.example.com.", "A", 1)])
+
+    def test_name_that_comes_back_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "not grouped"):
+            record_sets("www,A,,192.0.2.1\nmail,A,,192.0.2.2\nwww,A,,192.0.2.3\n", "csv")
+
+    def test_json_lines(self):
+        lines = [{"Name": "www.example.com.", "Type": "A", "TTL": 60,
+                  "ResourceRecords": [{"Value": "192.0.2.1"}]},
+                 {"Name": "mail.example.com.", "Type": "A", "TTL": 60,
+                  "ResourceRecords": [{"Value": "192.0.2.2"}]}]
+        text = "\n".join(json.dumps(line) for line in lines) + "\n"
+        self.assertEqual(record_sets(text, "json"), lines)
+
+    def test_json_array(self):
+        sets = [{"Name": "www.example.com.", "Type": "A", "TTL": 60,
+                 "ResourceRecords": [{"Value": "192.0.2.1"}]}]
+        self.assertEqual(record_sets(json.dumps(sets, indent=2), "json"), sets)
+
+    def test_json_errors(self):
+        with self.assertRaisesRegex(ValueError, "line 1: invalid JSON"):
+            record_sets("{not json}\n", "json")
+        with self.assertRaisesRegex(ValueError, "line 1: expected a record set"):
+            record_sets('{"Name": "www.example.com."}\n', "json")
+        with self.assertRaisesRegex(ValueError, "array item 0"):
+            record_sets('[["www", "A"]]', "json")
+
+class RoundTripTest(unittest.TestCase):
+    def test_export_then_import(self):
+        sets = [{"Name": "www.example.com.", "Type": "A", "TTL": 60,
+                 "ResourceRecords": [{"Value": "192.0.2.1"}, {"Value": "192.0.2.2"}]},
+                {"Name": "example.com.", "Type": "TXT", "TTL": 300,
+                 "ResourceRecords": [{"Value": '"hello  world"'}]}]
+        out = io.StringIO()
+        for record_set in sets:
+            write_record_set(out, record_set, "bind")
+        self.assertEqual(record_sets(out.getvalue(), "bind"), sets)
+
+if __name__ == "__main__":
+    unittest.main()